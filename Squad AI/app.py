@@ -11,28 +11,23 @@ from langchain_openai import ChatOpenAI
 #from langchain.sql_database import SQLDatabase
 #from sqlalchemy import create_engine
 from langchain.tools import tool
-from langgraph.prebuilt import ToolInvocation
-import json
-from langchain_core.messages import FunctionMessage
-from langgraph.prebuilt import ToolExecutor
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
 from langchain.tools.render import format_tool_to_openai_function
-from langchain_core.utils.function_calling import convert_to_openai_function
 from langchain_core.prompts import ChatPromptTemplate
 from operator import itemgetter
 import pandas as pd
-from langchain_community.document_loaders import CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.tools.tavily_search import TavilySearchResults
 
 from langchain_community.vectorstores import Qdrant
 from langchain_openai import OpenAIEmbeddings
 #from qdrant_client import QdrantClient
 from langchain.schema.output_parser import StrOutputParser
-from langchain_community.vectorstores import FAISS
+from user_index import build_vectorstore
 from langchain_core.messages import HumanMessage
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 import os
 import chainlit as cl
 from dotenv import load_dotenv
@@ -50,22 +45,14 @@ os.environ["LANGCHAIN_PROJECT"] = f"SquadAI - {unique_id}"
 class AgentState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
 
-document_loader = CSVLoader("./squadusersinfo.psv", csv_args={'delimiter': '|'})
-documents = document_loader.load()
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=30)
-split_documents = text_splitter.split_documents(documents)
-
 embeddings = OpenAIEmbeddings()
 #client = QdrantClient(location=":memory:")
 hf_embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
 
 
-
-for i in range(0, len(split_documents), 32):
-  if i == 0:
-    vectorstore = FAISS.from_documents(split_documents[i:i+32], hf_embeddings)
-    continue
-  vectorstore.add_documents(split_documents[i:i+32])
+# Embeds only user rows added or changed since the last start (concurrently,
+# in batches) and reuses the persisted vectors for everything else.
+vectorstore = build_vectorstore(hf_embeddings)
 
 
 hf_retriever = vectorstore.as_retriever()
@@ -106,20 +93,22 @@ def matchUser( query):
 
 tools= [TavilySearchResults(max_results=1), matchUser]
 
-tool_executor = ToolExecutor(tools)
+tools_by_name = {t.name: t for t in tools}
 
 
 model = ChatOpenAI(temperature=0, streaming=True)
 
-functions = [convert_to_openai_function(t) for t in tools]
-model = model.bind_functions(functions)
+# Tools (rather than legacy functions) let the model request several tool
+# calls in one turn, which call_tool then runs concurrently.
+# The tag lets run_convo pick this model's tokens out of the event stream.
+model = model.bind_tools(tools).with_config(tags=["agent_llm"])
 
 
 
 def should_continue(state):
     messages = state['messages']
     last_message = messages[-1]   
-    if "function_call" not in last_message.additional_kwargs:
+    if not last_message.tool_calls:
         return "end"  
     else:
         return "continue"
@@ -131,68 +120,52 @@ def call_model(state):
     return {"messages": [response]}
 
 
+async def acall_model(state):
+    messages = state['messages']
+    response = await model.ainvoke(messages)
+    return {"messages": [response]}
+
+
+def tool_message(tool_call, response):
+    return ToolMessage(content=str(response), name=tool_call["name"], tool_call_id=tool_call["id"])
+
+
+def invalid_tool(tool_call):
+    # Same reply ToolExecutor gave, so the model can correct itself.
+    return f"{tool_call['name']} is not a valid tool, try one of [{', '.join(tools_by_name)}]."
+
+
+def run_tool(tool_call):
+    if tool_call["name"] not in tools_by_name:
+        return invalid_tool(tool_call)
+    return tools_by_name[tool_call["name"]].invoke(tool_call["args"])
+
+
+async def arun_tool(tool_call):
+    if tool_call["name"] not in tools_by_name:
+        return invalid_tool(tool_call)
+    return await tools_by_name[tool_call["name"]].ainvoke(tool_call["args"])
+
+
 def call_tool(state):
-    messages = state['messages'] 
-    last_message = messages[-1]  
-    action = ToolInvocation(
-        tool=last_message.additional_kwargs["function_call"]["name"],
-        tool_input=json.loads(last_message.additional_kwargs["function_call"]["arguments"]),
-    )  
-    response = tool_executor.invoke(action) 
-    function_message = FunctionMessage(content=str(response), name=action.tool)   
-    return {"messages": [function_message]}
-
-def print_messages(messages):
-  next_is_tool = False
-  initial_query = True
-  for message in messages["messages"]:
-    if "function_call" in message.additional_kwargs:
-      print()
-      print(f'Tool Call - Name: {message.additional_kwargs["function_call"]["name"]} + Query: {message.additional_kwargs["function_call"]["arguments"]}')
-      next_is_tool = True
-      continue
-    if next_is_tool:
-      print(f"Tool Response: {message.content}")
-      next_is_tool = False
-      continue
-    if initial_query:
-      print(f"Initial Query: {message.content}")
-      print()
-      initial_query = False
-      continue
-    print()
-    print(f"Agent Response: {message.content}")
-
-def construct_response(messages):
-  next_is_tool = False
-  initial_query = True
-  response = ""
-  for message in messages["messages"]:
-    if "function_call" in message.additional_kwargs:
-      print()
-      print(f'Tool Call - Name: {message.additional_kwargs["function_call"]["name"]} + Query: {message.additional_kwargs["function_call"]["arguments"]}')
-      next_is_tool = True
-      continue
-    if next_is_tool:
-      print(f"Tool Response: {message.content}")
-      if "url" not in message.content:
-        response = response + message.content
-      next_is_tool = False
-      continue
-    if initial_query:
-      print(f"Initial Query: {message.content}")
-      print()
-      initial_query = False
-      continue
-    print()
-    print(f"Agent Response: {message.content}")
-    response = response + message.content
-    return response
+    # Runs every tool call of the last turn at once and returns all results.
+    tool_calls = state['messages'][-1].tool_calls
+    with ThreadPoolExecutor(max_workers=len(tool_calls)) as executor:
+        responses = executor.map(run_tool, tool_calls)
+        return {"messages": [tool_message(c, r) for c, r in zip(tool_calls, responses)]}
+
+
+async def acall_tool(state):
+    # Async tools run on the event loop; ainvoke moves sync tools (matchUser)
+    # to a worker thread, so all calls of the turn overlap.
+    tool_calls = state['messages'][-1].tool_calls
+    responses = await asyncio.gather(*(arun_tool(c) for c in tool_calls))
+    return {"messages": [tool_message(c, r) for c, r in zip(tool_calls, responses)]}
 
 workflow = StateGraph(AgentState)
 
-workflow.add_node("agent", call_model)
-workflow.add_node("action", call_tool)
+workflow.add_node("agent", RunnableLambda(call_model, afunc=acall_model))
+workflow.add_node("action", RunnableLambda(call_tool, afunc=acall_tool))
 
 workflow.set_entry_point("agent")
 
@@ -215,25 +188,31 @@ app = workflow.compile()
 
 #result = app.invoke({"messages": messages})
 
-#print_messages(result)
 #messages = app.invoke(inputs)
 
-#print_messages(messages)
 @cl.on_message
 async def run_convo(message: cl.Message):   
     msg = cl.Message(content="")
-    await msg.send()  
-    await cl.sleep(1) #hack to simulate loader!
 
     inputs = {"messages": [HumanMessage(content=message.content)]}
-
-    res = app.invoke(inputs, config=RunnableConfig(callbacks=[
+    config = RunnableConfig(callbacks=[
         cl.LangchainCallbackHandler(
             to_ignore=["ChannelRead", "RunnableLambda", "ChannelWrite", "__start__", "_execute"]      
-        )]))
-    
-    content = construct_response(res)
-    #for response in (res["messages"]):
-     #   if message.content not in response:
-      #      content = content+response.content
-    await cl.Message(content=content).send() 
+        )])
+
+    # Drive the graph on the event loop and forward results as they are
+    # produced: tool answers without URLs when each tool finishes, then the
+    # agent's reply token by token.
+    async for event in app.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        if kind == "on_tool_end":
+            output = event["data"].get("output")
+            content = str(getattr(output, "content", output))
+            if "url" not in content:
+                await msg.stream_token(content + "\n\n")
+        elif kind == "on_chat_model_stream" and "agent_llm" in event.get("tags", []):
+            token = event["data"]["chunk"].content
+            if token:
+                await msg.stream_token(token)
+
+    await msg.send()
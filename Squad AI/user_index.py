@@ -0,0 +1,93 @@
+"""
+Incremental FAISS index over the Squad AI user list.
+
+Row embeddings are persisted next to a hash of the row text. On start only
+rows that were added or changed since the last build are embedded (in
+concurrent batches); everything else is reused from disk, and rows that
+disappeared from the user list are dropped.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import numpy as np
+from langchain_community.document_loaders import CSVLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+
+USERS_PATH = "./squadusersinfo.psv"
+INDEX_DIR = os.getenv("USER_INDEX_DIR", "./user_index")
+INDEX_VERSION = 1
+
+def load_user_documents(path=USERS_PATH):
+    document_loader = CSVLoader(path, csv_args={'delimiter': '|'})
+    documents = document_loader.load()
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=30)
+    return text_splitter.split_documents(documents)
+
+def row_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def read_index(index_dir, model):
+    """Returns the persisted {row hash: vector}, empty if missing or built with another model."""
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION or manifest.get("model") != model:
+            return {}
+        vectors = np.load(os.path.join(index_dir, "vectors.npy"))
+    except (OSError, ValueError):
+        return {}
+    if len(vectors) != len(manifest["hashes"]):
+        return {}
+    return dict(zip(manifest["hashes"], vectors))
+
+def write_index(index_dir, model, hashes, vectors):
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, "vectors.npy.tmp"), "wb") as f:
+        np.save(f, vectors)
+    with open(os.path.join(index_dir, "manifest.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "model": model, "hashes": hashes}, f)
+    # Vectors first: a stale manifest over new vectors is rejected by its length check.
+    os.replace(os.path.join(index_dir, "vectors.npy.tmp"), os.path.join(index_dir, "vectors.npy"))
+    os.replace(os.path.join(index_dir, "manifest.json.tmp"), os.path.join(index_dir, "manifest.json"))
+
+async def embed_concurrently(embeddings, texts, batch_size=32, max_concurrency=4):
+    """Embeds `texts` in batches, with at most `max_concurrency` requests in flight."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embed_batch(batch):
+        async with semaphore:
+            return await embeddings.aembed_documents(batch)
+
+    batches = await asyncio.gather(
+        *(embed_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size))
+    )
+    return [vector for batch in batches for vector in batch]
+
+async def abuild_vectorstore(embeddings, index_dir=INDEX_DIR, users_path=USERS_PATH, batch_size=32, max_concurrency=4):
+    documents = load_user_documents(users_path)
+    texts = [document.page_content for document in documents]
+    hashes = [row_hash(text) for text in texts]
+
+    cached = read_index(index_dir, embeddings.model)
+    missing = list({h: text for h, text in zip(hashes, texts) if h not in cached}.items())
+    if missing:
+        vectors = await embed_concurrently(
+            embeddings, [text for _, text in missing], batch_size, max_concurrency
+        )
+        cached.update(zip((h for h, _ in missing), vectors))
+
+    vectors = np.asarray([cached[h] for h in hashes], dtype=np.float32)
+    # Rewrite the index when rows were embedded or removed.
+    if missing or len(cached) != len(set(hashes)):
+        write_index(index_dir, embeddings.model, hashes, vectors)
+
+    return FAISS.from_embeddings(
+        text_embeddings=list(zip(texts, vectors.tolist())),
+        embedding=embeddings,
+        metadatas=[document.metadata for document in documents],
+    )
+
+def build_vectorstore(embeddings, **kwargs):
+    return asyncio.run(abuild_vectorstore(embeddings, **kwargs))
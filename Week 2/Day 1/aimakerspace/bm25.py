@@ -0,0 +1,119 @@
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens; keeps tickers, names and IDs intact."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index with postings stored in compact typed arrays.
+
+    Documents get append-only internal ids mapped to the owning
+    `VectorDatabase` row, so re-adding a row or removing one is O(1): the old
+    document is only marked dead and skipped at query time.
+
+    :param k1: Term-frequency saturation
+    :param b: Document-length normalization strength
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_rows = array("q")
+        self._doc_lengths = array("f")
+        self._row_docs: Dict[int, int] = {}
+        self._total_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self._row_docs)
+
+    def add(self, row: int, text: str) -> None:
+        self.remove(row)
+        doc = len(self._doc_rows)
+        terms = tokenize(text)
+        for term, frequency in Counter(terms).items():
+            docs, frequencies = self._postings.setdefault(term, (array("q"), array("f")))
+            docs.append(doc)
+            frequencies.append(frequency)
+        self._doc_rows.append(row)
+        self._doc_lengths.append(len(terms))
+        self._row_docs[row] = doc
+        self._total_length += len(terms)
+
+    def remove(self, row: int) -> None:
+        doc = self._row_docs.pop(row, None)
+        if doc is not None:
+            self._doc_rows[doc] = -1
+            self._total_length -= self._doc_lengths[doc]
+
+    def compact(self, row_map: np.ndarray) -> None:
+        """
+        Drops dead documents from the postings and renumbers rows after
+        `VectorDatabase.compact`; `row_map[old] == new`.
+        """
+        doc_rows = np.frombuffer(self._doc_rows, dtype=np.int64)
+        alive = doc_rows >= 0
+        doc_map = np.full(len(doc_rows), -1, dtype=np.int64)
+        doc_map[alive] = np.arange(int(alive.sum()))
+        for term, (docs, frequencies) in list(self._postings.items()):
+            docs = np.frombuffer(docs, dtype=np.int64)
+            keep = alive[docs]
+            if not keep.any():
+                del self._postings[term]
+                continue
+            self._postings[term] = (
+                array("q", doc_map[docs[keep]].tobytes()),
+                array("f", np.frombuffer(frequencies, dtype=np.float32)[keep].tobytes()),
+            )
+        rows = row_map[doc_rows[alive]]
+        lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)[alive]
+        self._doc_rows = array("q", rows.tobytes())
+        self._doc_lengths = array("f", lengths.tobytes())
+        self._row_docs = {int(row): doc for doc, row in enumerate(rows)}
+
+    def search(
+        self, query: str, k: int, rows: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores the live documents containing any query term.
+
+        :param rows: Restrict results to these database rows
+        :return: (rows, scores) of the top-k matches, best first
+        """
+        doc_rows = np.frombuffer(self._doc_rows, dtype=np.int64)
+        scores = np.zeros(len(doc_rows), dtype=np.float32)
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), scores[:0]
+
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.float32)
+        average_length = self._total_length / len(self) or 1.0
+        for term in set(tokenize(query)):
+            if term not in self._postings:
+                continue
+            docs, frequencies = (
+                np.frombuffer(postings, dtype=dtype)
+                for postings, dtype in zip(self._postings[term], (np.int64, np.float32))
+            )
+            # Document frequency still counts dead documents until compaction.
+            idf = math.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / average_length)
+            scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+        live = doc_rows >= 0
+        if rows is not None:
+            live &= np.isin(doc_rows, rows)
+        matched = np.flatnonzero(live & (scores > 0))
+        if k < len(matched):
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = matched[np.argsort(-scores[matched], kind="stable")]
+        return doc_rows[top], scores[top]
@@ -0,0 +1,204 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from aimakerspace.text_utils import get_encoding
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def suffix_prefix_overlap(left: str, right: str, min_overlap: int = 20) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right`,
+    or 0 when it is shorter than `min_overlap` characters.
+    """
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+class _Passage:
+    __slots__ = ("text", "score", "rank", "doc_id", "start", "end", "min_overlap", "chunks")
+
+    def __init__(
+        self, text: str, score: float, rank: int, span: Optional[Tuple], min_overlap: int
+    ):
+        self.text = text
+        self.min_overlap = min_overlap
+        self.score = score
+        self.rank = rank
+        self.doc_id, self.start, self.end = span or (None, None, None)
+        # The original retrieved chunks this passage was merged from.
+        self.chunks = [self]
+
+    def copy(self) -> "_Passage":
+        passage = _Passage(
+            self.text, self.score, self.rank, (self.doc_id, self.start, self.end), self.min_overlap
+        )
+        passage.chunks = list(self.chunks)
+        return passage
+
+    def merge(self, other: "_Passage") -> bool:
+        """Absorbs `other` if the two overlap or touch; returns whether it did."""
+        if self.doc_id is not None and self.doc_id == other.doc_id:
+            if other.start > self.end or self.start > other.end:
+                return False
+            left, right = (self, other) if self.start <= other.start else (other, self)
+            if right.end > left.end:
+                text = left.text + right.text[left.end - right.start :]
+            else:
+                text = left.text
+            self.text, self.start, self.end = text, left.start, max(left.end, right.end)
+        elif other.text in self.text:
+            pass
+        elif self.text in other.text:
+            self.text = other.text
+        else:
+            overlap = suffix_prefix_overlap(self.text, other.text, self.min_overlap)
+            if overlap:
+                self.text += other.text[overlap:]
+            else:
+                overlap = suffix_prefix_overlap(other.text, self.text, self.min_overlap)
+                if not overlap:
+                    return False
+                self.text = other.text + self.text[overlap:]
+            self.doc_id = self.start = self.end = None
+        self.score = max(self.score, other.score)
+        self.rank = min(self.rank, other.rank)
+        self.chunks = self.chunks + other.chunks
+        return True
+
+
+def _merge_into(passages: List[_Passage], passage: _Passage) -> List[_Passage]:
+    """
+    Returns `passages` plus `passage`, merged with every passage it touches.
+    Works on copies, so the inputs are left unchanged.
+    """
+    passages = list(passages)
+    # A chunk can bridge two passages, so keep merging until it settles.
+    merged = True
+    while merged:
+        merged = False
+        for index, other in enumerate(passages):
+            candidate = other.copy()
+            if candidate.merge(passage):
+                del passages[index]
+                passage = candidate
+                merged = True
+                break
+    passages.append(passage)
+    return passages
+
+
+class ContextPacker:
+    """
+    Turns ranked `VectorDatabase` results into a prompt context that fits a
+    token budget.
+
+    Chunks contained in another are dropped and overlapping or adjacent
+    chunks are merged into one passage. When a record's metadata carries
+    `doc_id` / `start` / `end` offsets (see `ChunkSpans.metadata`) merging is
+    exact; otherwise chunks are joined on a shared suffix/prefix of at least
+    `min_overlap` characters, which catches `CharacterTextSplitter` overlap.
+    Passages are then packed best-ranked first until `max_tokens` is reached;
+    a merged passage that does not fit is cut back to its best-ranked chunks.
+
+    :param max_tokens: Token budget for the packed context, separators included
+    :param model_name: Model (or encoding) whose cached tokenizer counts tokens
+    :param token_counter: Optional replacement for the tiktoken count; an
+        over-long best chunk is then truncated to the longest prefix it allows
+    """
+
+    def __init__(
+        self,
+        vector_db: VectorDatabase,
+        max_tokens: int = 2000,
+        model_name: str = "gpt-4o",
+        separator: str = "\n\n",
+        min_overlap: int = 20,
+        token_counter: Callable[[str], int] = None,
+    ):
+        self.vector_db = vector_db
+        self.max_tokens = max_tokens
+        self.model_name = model_name
+        self.separator = separator
+        self.min_overlap = min_overlap
+        self.token_counter = token_counter or self._count_tokens
+        self._custom_counter = token_counter is not None
+
+    def _count_tokens(self, text: str) -> int:
+        return len(get_encoding(self.model_name).encode(text, disallowed_special=()))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        if not self._custom_counter:
+            encoding = get_encoding(self.model_name)
+            return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+        # Binary search for the longest prefix the supplied counter accepts.
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.token_counter(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+    def _passages(self, results: List[Tuple[str, float]]) -> List[_Passage]:
+        passages: List[_Passage] = []
+        for rank, (key, score) in enumerate(results):
+            text = self.vector_db.get_text(key)
+            if not text:
+                continue
+            metadata: Dict = self.vector_db.get_metadata(key) or {}
+            span = None
+            if all(field in metadata for field in ("doc_id", "start", "end")):
+                span = (metadata["doc_id"], metadata["start"], metadata["end"])
+            passages = _merge_into(passages, _Passage(text, score, rank, span, self.min_overlap))
+        passages.sort(key=lambda passage: passage.rank)
+        return passages
+
+    def _cost(self, passages: List[_Passage]) -> int:
+        separators = self.token_counter(self.separator) * (len(passages) - 1)
+        return sum(self.token_counter(passage.text) for passage in passages) + separators
+
+    def _fit(self, passage: _Passage, budget: int) -> List[_Passage]:
+        """
+        Rebuilds an over-budget passage from its chunks, best-ranked first,
+        keeping each chunk only if the result still fits. Lower-ranked
+        neighbours can therefore never push out the best chunk.
+        """
+        pieces: List[_Passage] = []
+        for chunk in sorted(passage.chunks, key=lambda chunk: chunk.rank):
+            single = chunk.copy()
+            single.chunks = [chunk]
+            candidate = _merge_into(pieces, single)
+            if self._cost(candidate) <= budget:
+                pieces = candidate
+        return sorted(pieces, key=lambda piece: piece.rank)
+
+    def select(self, results: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """
+        :param results: (key, score) pairs as returned by `search` / `search_by_text`
+        :return: (text, score) of the passages that fit the budget, best first
+        """
+        selected = []
+        budget = self.max_tokens
+        separator_tokens = self.token_counter(self.separator)
+        for passage in self._passages(results):
+            available = budget - (separator_tokens if selected else 0)
+            pieces = [passage] if self._cost([passage]) <= available else self._fit(passage, available)
+            if pieces:
+                selected.extend((piece.text, piece.score) for piece in pieces)
+                budget = available - self._cost(pieces)
+            elif not selected:
+                # Even the best chunk alone is too long: keep its leading part.
+                best = min(passage.chunks, key=lambda chunk: chunk.rank)
+                selected.append((self._truncate(best.text, budget), best.score))
+                break
+        return selected
+
+    def pack(self, results: List[Tuple[str, float]]) -> str:
+        """Returns the selected passages joined into one context string."""
+        return self.separator.join(text for text, _ in self.select(results))
@@ -0,0 +1,132 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import List
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class MinHashDeduplicator:
+    """
+    Finds exact and near-duplicate texts with MinHash signatures and LSH banding.
+
+    Texts are compared on character shingles. Signatures are split into
+    `bands` bands of `num_perm // bands` rows; only texts sharing a band
+    bucket are compared, so the work stays roughly linear in corpus size.
+    Candidate pairs are kept when their estimated Jaccard similarity reaches
+    `threshold`.
+
+    :param threshold: Minimum estimated Jaccard similarity to merge two texts
+    :param num_perm: Number of MinHash permutations per signature
+    :param bands: Number of LSH bands; must divide `num_perm`
+    :param shingle_size: Character n-gram length
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Odd multipliers keep each multiply-shift hash a bijection mod 2**64.
+        self._a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        text = normalize(text)
+        size = self.shingle_size
+        shingles = {text[i : i + size] for i in range(max(1, len(text) - size + 1))}
+        return np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+
+    def signatures(self, texts: List[str], block: int = 8192) -> np.ndarray:
+        """
+        MinHash signatures, one row of `num_perm` uint32 values per text.
+
+        Permutations are multiply-shift hashes over wrapping uint64
+        arithmetic, applied to the shingles of many texts at once; `block`
+        bounds the number of shingles hashed per step.
+        """
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        start = 0
+        while start < len(texts):
+            hashes, lengths = [], []
+            end, total = start, 0
+            while end < len(texts) and (total < block or end == start):
+                hashes.append(self._shingle_hashes(texts[end]))
+                lengths.append(len(hashes[-1]))
+                total += lengths[-1]
+                end += 1
+            permuted = np.multiply.outer(np.concatenate(hashes), self._a)
+            permuted += self._b
+            permuted >>= np.uint64(32)
+            bounds = np.cumsum([0] + lengths)
+            for row, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]), start):
+                result[row] = permuted[lo:hi].min(axis=0)
+            start = end
+        return result
+
+    def representatives(self, texts: List[str]) -> List[int]:
+        """
+        Clusters duplicates and picks the first occurrence of each cluster.
+
+        :return: For every input text, the index of its cluster representative
+        """
+        parent = list(range(len(texts)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int) -> None:
+            i, j = find(i), find(j)
+            if i != j:
+                parent[max(i, j)] = min(i, j)
+
+        # Exact duplicates (after whitespace/case normalization) need no signature.
+        first_seen = {}
+        unique = []
+        for i, text in enumerate(texts):
+            key = normalize(text)
+            if key in first_seen:
+                union(first_seen[key], i)
+            else:
+                first_seen[key] = i
+                unique.append(i)
+
+        if len(unique) > 1:
+            signatures = self.signatures([texts[i] for i in unique])
+            rows = self.num_perm // self.bands
+            for band in range(self.bands):
+                buckets = defaultdict(list)
+                band_slice = signatures[:, band * rows : (band + 1) * rows]
+                for position, band_hash in enumerate(map(bytes, band_slice)):
+                    buckets[band_hash].append(position)
+                for members in buckets.values():
+                    head = members[0]
+                    for other in members[1:]:
+                        if find(unique[head]) == find(unique[other]):
+                            continue
+                        similarity = np.mean(signatures[head] == signatures[other])
+                        if similarity >= self.threshold:
+                            union(unique[head], unique[other])
+        return [find(i) for i in range(len(texts))]
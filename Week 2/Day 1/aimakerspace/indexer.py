@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+from typing import Dict, List
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IncrementalIndexer:
+    """
+    Keeps a persisted `VectorDatabase` in sync with a file or directory.
+
+    A manifest records each source file's size, mtime, content hash and chunk
+    ids (hashes of the chunk texts, which are the database keys). `aupdate`
+    only re-chunks and re-embeds files that are new or whose content
+    changed, and deletes the vectors of files that disappeared. Files whose
+    size and mtime are unchanged are not even re-hashed.
+
+    :param source_path: File or directory handed to `TextFileLoader`
+    :param index_path: Directory holding the saved database and manifest
+    """
+
+    MANIFEST = "manifest.json"
+    VERSION = 2
+
+    def __init__(
+        self,
+        source_path: str,
+        index_path: str,
+        embedding_model: EmbeddingModel = None,
+        splitter: CharacterTextSplitter = None,
+    ):
+        self.source_path = source_path
+        self.index_path = index_path
+        self.splitter = splitter or CharacterTextSplitter()
+        manifest_path = os.path.join(index_path, self.MANIFEST)
+        manifest = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        # Indexes from an older manifest format are rebuilt from scratch.
+        if manifest is not None and manifest.get("version") == self.VERSION:
+            self.manifest = manifest
+            self.vector_db = VectorDatabase.load(index_path, embedding_model)
+        else:
+            self.manifest = {"version": self.VERSION, "files": {}}
+            self.vector_db = VectorDatabase(embedding_model)
+
+    def _chunk_file(self, file_path: str) -> List[str]:
+        documents = TextFileLoader(file_path).load_documents()
+        return list(dict.fromkeys(self.splitter.split_texts(documents)))
+
+    async def aupdate(self) -> Dict[str, List[str]]:
+        """
+        Brings the index up to date with the source files.
+
+        :return: The "added", "changed" and "removed" file paths
+        """
+        files: Dict[str, Dict] = self.manifest["files"]
+        current = set(TextFileLoader(self.source_path).iter_files())
+        report = {"added": [], "changed": [], "removed": sorted(set(files) - current)}
+        # New manifest entries and chunk texts; only committed once the new
+        # chunks are embedded, so a failed run is retried in full.
+        updates: Dict[str, Dict] = {}
+        texts: Dict[str, str] = {}
+
+        for file_path in sorted(current):
+            stat = os.stat(file_path)
+            entry = files.get(file_path)
+            if entry and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            sha256 = file_sha256(file_path)
+            if entry and entry["sha256"] == sha256:
+                updates[file_path] = dict(entry, mtime_ns=stat.st_mtime_ns)
+                continue
+            report["changed" if entry else "added"].append(file_path)
+            chunks = self._chunk_file(file_path)
+            ids = [chunk_id(chunk) for chunk in chunks]
+            texts.update(zip(ids, chunks))
+            updates[file_path] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+                "ids": ids,
+            }
+
+        new_ids = [key for key in texts if key not in self.vector_db]
+        if new_ids:
+            await self.vector_db.abuild_from_list(
+                [texts[key] for key in new_ids], ids=new_ids
+            )
+
+        remaining = {path: entry for path, entry in files.items() if path in current}
+        remaining.update(updates)
+        # Identical chunks share an id across files; only drop ids no
+        # remaining file references.
+        referenced = {key for entry in remaining.values() for key in entry["ids"]}
+        for file_path in report["changed"] + report["removed"]:
+            for key in files[file_path]["ids"]:
+                if key not in referenced:
+                    self.vector_db.delete(key)
+        self.manifest["files"] = remaining
+        return report
+
+    def save(self) -> None:
+        self.vector_db.save(self.index_path)
+        with open(os.path.join(self.index_path, self.MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
@@ -0,0 +1,164 @@
+from array import array
+from typing import List, Optional
+import numpy as np
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0
+) -> np.ndarray:
+    """
+    Clusters unit-length vectors by cosine similarity.
+
+    :param vectors: (n, dim) float32 matrix of L2-normalized rows
+    :param n_clusters: Number of centroids to return
+    :return: (n_clusters, dim) float32 matrix of L2-normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters with random points so every list gets used.
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        updated = sums / np.where(norms > 0, norms, 1)
+        if np.allclose(updated, centroids, atol=1e-6):
+            break
+        centroids = updated.astype(np.float32)
+    return centroids
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for every row, computed in blocks."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        scores = vectors[start : start + block] @ centroids.T
+        assignment[start : start + block] = scores.argmax(axis=1)
+    return assignment
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF-flat) approximate index over normalized vectors.
+
+    Vectors are bucketed under their nearest k-means centroid; a query only
+    scans the buckets of its `n_probe` nearest centroids. Until
+    `min_train_size` vectors have been added the index stays untrained and
+    `VectorDatabase` falls back to an exact scan. Centroids trained on the
+    first few documents fit the rest of a growing collection poorly, so
+    `VectorDatabase` retrains the index whenever it has grown
+    `retrain_factor` times past the size it was last trained on.
+
+    :param n_lists: Number of centroids, defaults to sqrt(n) at training time
+    :param n_probe: Buckets scanned per query; higher is slower but more accurate
+    :param min_train_size: Vectors to buffer before the centroids are trained
+    :param retrain_factor: Growth factor that triggers retraining; None disables it
+    """
+
+    def __init__(
+        self,
+        n_lists: int = None,
+        n_probe: int = 8,
+        min_train_size: int = 1024,
+        n_iter: int = 20,
+        seed: int = 0,
+        retrain_factor: Optional[float] = 2.0,
+    ):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self._lists: List[array] = []
+        self._assignment = {}
+        self._pending_rows: List[int] = []
+        self._pending_vectors: List[np.ndarray] = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def needs_retrain(self) -> bool:
+        """Whether the index has outgrown the vectors it was trained on."""
+        return (
+            self.is_trained
+            and self.retrain_factor is not None
+            and len(self._assignment) >= self.retrain_factor * self.trained_size
+        )
+
+    def train(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """(Re)computes the centroids from `vectors` and assigns every row."""
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        self.centroids = spherical_kmeans(vectors, n_lists, self.n_iter, self.seed)
+        self.trained_size = len(vectors)
+        self._lists = [array("q") for _ in range(len(self.centroids))]
+        self._assignment = {}
+        self._pending_rows, self._pending_vectors = [], []
+        self._assign(np.asarray(rows), vectors)
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Adds (or re-assigns) normalized vectors stored at the given rows."""
+        rows = np.atleast_1d(np.asarray(rows))
+        vectors = np.atleast_2d(vectors)
+        if self.is_trained:
+            self.remove(rows)
+            self._assign(rows, vectors)
+            return
+
+        self._pending_rows.extend(int(row) for row in rows)
+        self._pending_vectors.extend(np.array(vectors, dtype=np.float32))
+        if len(self._pending_rows) >= self.min_train_size:
+            # Keep only the latest vector for rows that were inserted twice.
+            latest = dict(zip(self._pending_rows, self._pending_vectors))
+            self.train(np.fromiter(latest, dtype=np.int64), np.stack(list(latest.values())))
+
+    def remove(self, rows: np.ndarray) -> None:
+        if not self.is_trained:
+            removed = {int(row) for row in np.atleast_1d(rows)}
+            kept = [
+                (row, vector)
+                for row, vector in zip(self._pending_rows, self._pending_vectors)
+                if row not in removed
+            ]
+            self._pending_rows = [row for row, _ in kept]
+            self._pending_vectors = [vector for _, vector in kept]
+            return
+        for row in np.atleast_1d(rows):
+            bucket = self._assignment.pop(int(row), None)
+            if bucket is not None:
+                bucket_rows = self._lists[bucket]
+                del bucket_rows[bucket_rows.index(int(row))]
+
+    def remap(self, row_map: np.ndarray) -> None:
+        """Renumbers stored rows after `VectorDatabase.compact`; `row_map[old] == new`."""
+        self._lists = [
+            array("q", row_map[np.frombuffer(rows, dtype=np.int64)].tobytes())
+            for rows in self._lists
+        ]
+        self._assignment = {
+            int(row_map[row]): bucket for row, bucket in self._assignment.items()
+        }
+        self._pending_rows = [int(row_map[row]) for row in self._pending_rows]
+
+    def _assign(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        for row, bucket in zip(rows, _nearest(vectors, self.centroids)):
+            self._lists[bucket].append(int(row))
+            self._assignment[int(row)] = int(bucket)
+
+    def candidates(self, query: np.ndarray, n_probe: int = None) -> np.ndarray:
+        """Rows stored in the buckets nearest to a normalized query vector."""
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        scores = self.centroids @ query
+        probes = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        return np.concatenate(
+            [np.frombuffer(self._lists[bucket], dtype=np.int64) for bucket in probes]
+        )
@@ -0,0 +1,121 @@
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple, Union
+
+# A filter is either a callable taking a metadata dict, or a dict mapping
+# field names to a value (equality) or to an operator dict such as
+# {"$in": [...]}, {"$gte": 2020} or {"$exists": True}. All clauses must match.
+Filter = Union[Dict[str, Any], Callable[[Dict], bool]]
+
+_MISSING = object()
+
+
+def _values(value) -> Tuple:
+    """List-like metadata values match on any of their elements."""
+    return tuple(value) if isinstance(value, (list, tuple, set)) else (value,)
+
+
+def _match_clause(value, condition) -> bool:
+    if not isinstance(condition, dict):
+        return value is not _MISSING and condition in _values(value)
+
+    for operator, operand in condition.items():
+        if operator == "$exists":
+            if (value is not _MISSING) != bool(operand):
+                return False
+            continue
+        if value is _MISSING:
+            return False
+        values = _values(value)
+        if operator == "$eq":
+            matched = operand in values
+        elif operator == "$ne":
+            matched = operand not in values
+        elif operator == "$in":
+            matched = any(v in operand for v in values)
+        elif operator == "$nin":
+            matched = not any(v in operand for v in values)
+        elif operator == "$gt":
+            matched = any(v > operand for v in values)
+        elif operator == "$gte":
+            matched = any(v >= operand for v in values)
+        elif operator == "$lt":
+            matched = any(v < operand for v in values)
+        elif operator == "$lte":
+            matched = any(v <= operand for v in values)
+        else:
+            raise ValueError(f"Unknown filter operator {operator!r}")
+        if not matched:
+            return False
+    return True
+
+
+def matches_filter(metadata: Optional[Dict], filter: Filter) -> bool:
+    """Evaluates a filter expression against one record's metadata."""
+    metadata = metadata or {}
+    if callable(filter):
+        return bool(filter(metadata))
+    return all(
+        _match_clause(metadata.get(field, _MISSING), condition)
+        for field, condition in filter.items()
+    )
+
+
+class MetadataIndex:
+    """
+    Inverted indexes from (field, value) to row ids for selected metadata fields.
+
+    Equality and `$in` clauses on indexed fields are answered from the
+    postings, so a selective filter only touches the rows it matches.
+    """
+
+    def __init__(self, fields: Iterable[str] = ()):
+        self.fields = tuple(fields)
+        self._postings: Dict[str, Dict[Any, Set[int]]] = {
+            field: defaultdict(set) for field in self.fields
+        }
+
+    def add(self, row: int, metadata: Optional[Dict]) -> None:
+        for field in self.fields:
+            if metadata and field in metadata:
+                for value in _values(metadata[field]):
+                    self._postings[field][value].add(row)
+
+    def remove(self, row: int, metadata: Optional[Dict]) -> None:
+        for field in self.fields:
+            if metadata and field in metadata:
+                for value in _values(metadata[field]):
+                    postings = self._postings[field].get(value)
+                    if postings is not None:
+                        postings.discard(row)
+                        if not postings:
+                            del self._postings[field][value]
+
+    def candidate_rows(self, filter: Filter) -> Tuple[Optional[Set[int]], bool]:
+        """
+        Narrows a filter using the inverted indexes.
+
+        :return: (rows, exact). `rows` is None when no clause could use an
+            index; `exact` is True when every clause was answered by the
+            index, so the rows need no further checking.
+        """
+        if callable(filter):
+            return None, False
+
+        rows, exact = None, True
+        for field, condition in filter.items():
+            if field not in self._postings:
+                exact = False
+                continue
+            if not isinstance(condition, dict):
+                lookup = [condition]
+            elif set(condition) == {"$eq"}:
+                lookup = [condition["$eq"]]
+            elif set(condition) == {"$in"}:
+                lookup = list(condition["$in"])
+            else:
+                exact = False
+                continue
+            postings = self._postings[field]
+            matched = set().union(*(postings.get(value, ()) for value in lookup))
+            rows = matched if rows is None else rows & matched
+        return rows, exact and rows is not None
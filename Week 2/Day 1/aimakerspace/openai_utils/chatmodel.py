@@ -1,27 +1,124 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+from typing import AsyncIterator, Iterator
 import os
+from aimakerspace.openai_utils.response_cache import ResponseCache
 
 load_dotenv()
 
 
+def _delta_content(chunk) -> str:
+    """Text carried by one streamed chunk; empty for role/usage-only chunks."""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
 class ChatOpenAI:
-    def __init__(self, model_name: str = "gpt-3.5-turbo"):
+    """
+    Chat completions wrapper.
+
+    Each instance owns one sync and one async OpenAI client, so HTTP
+    connections are pooled and kept alive across calls. `stream` / `astream`
+    yield the response text piece by piece as it is generated.
+
+    :param cache: Optional `ResponseCache` consulted by every text-only call;
+        a cached answer is returned (or streamed as one piece) without a request
+    """
+
+    def __init__(self, model_name: str = "gpt-3.5-turbo", cache: ResponseCache = None):
         self.model_name = model_name
+        self.cache = cache
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         if self.openai_api_key is None:
             raise ValueError("OPENAI_API_KEY is not set")
+        self.client = OpenAI()
+        self.async_client = AsyncOpenAI()
 
     def run(self, messages, text_only: bool = True, **kwargs):
         if not isinstance(messages, list):
             raise ValueError("messages must be a list")
 
-        client = OpenAI()
-        response = client.chat.completions.create(
+        use_cache = self.cache is not None and text_only
+        if use_cache:
+            cached = self.cache.get(self.model_name, messages, **kwargs)
+            if cached is not None:
+                return cached
+
+        response = self.client.chat.completions.create(
             model=self.model_name, messages=messages, **kwargs
         )
 
         if text_only:
-            return response.choices[0].message.content
+            content = response.choices[0].message.content
+            if use_cache and content is not None:
+                self.cache.put(self.model_name, messages, content, **kwargs)
+            return content
 
         return response
+
+    async def arun(self, messages, text_only: bool = True, **kwargs):
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        use_cache = self.cache is not None and text_only
+        if use_cache:
+            cached = await self.cache.aget(self.model_name, messages, **kwargs)
+            if cached is not None:
+                return cached
+
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name, messages=messages, **kwargs
+        )
+
+        if text_only:
+            content = response.choices[0].message.content
+            if use_cache and content is not None:
+                self.cache.put(self.model_name, messages, content, **kwargs)
+            return content
+
+        return response
+
+    def stream(self, messages, **kwargs) -> Iterator[str]:
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        if self.cache is not None:
+            cached = self.cache.get(self.model_name, messages, **kwargs)
+            if cached is not None:
+                yield cached
+                return
+
+        response = self.client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        pieces = []
+        for chunk in response:
+            content = _delta_content(chunk)
+            if content:
+                pieces.append(content)
+                yield content
+        if self.cache is not None and pieces:
+            self.cache.put(self.model_name, messages, "".join(pieces), **kwargs)
+
+    async def astream(self, messages, **kwargs) -> AsyncIterator[str]:
+        if not isinstance(messages, list):
+            raise ValueError("messages must be a list")
+
+        if self.cache is not None:
+            cached = await self.cache.aget(self.model_name, messages, **kwargs)
+            if cached is not None:
+                yield cached
+                return
+
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        pieces = []
+        async for chunk in response:
+            content = _delta_content(chunk)
+            if content:
+                pieces.append(content)
+                yield content
+        if self.cache is not None and pieces:
+            self.cache.put(self.model_name, messages, "".join(pieces), **kwargs)
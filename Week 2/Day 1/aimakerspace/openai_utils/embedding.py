@@ -1,17 +1,51 @@
 from dotenv import load_dotenv
 from openai import AsyncOpenAI, OpenAI
 import openai
-from typing import List
+from typing import Callable, Dict, Iterator, List, Tuple
 import os
 import asyncio
+import random
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache
+
+
+def approximate_token_count(text: str) -> int:
+    """Cheap upper-bound style estimate (~3 bytes per token) used for batching."""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
 
 
 class EmbeddingModel:
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small"):
+    """
+    Thin wrapper around the OpenAI embeddings endpoint.
+
+    Lists of texts are split into requests of at most `batch_size` inputs and
+    `max_batch_tokens` (estimated) tokens. The async path sends up to
+    `max_concurrency` requests at once and retries rate-limit, connection and
+    5xx errors with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        dimensions: int = None,
+        cache: EmbeddingCache = None,
+        batch_size: int = 512,
+        max_batch_tokens: int = 250_000,
+        max_concurrency: int = 8,
+        max_retries: int = 6,
+        token_counter: Callable[[str], int] = approximate_token_count,
+    ):
         load_dotenv()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.async_client = AsyncOpenAI()
-        self.client = OpenAI()
+        # The async path retries with its own backoff, so the client must not
+        # retry as well; the sync path relies on the client's retries instead.
+        self.async_client = AsyncOpenAI(max_retries=0)
+        self.client = OpenAI(max_retries=max_retries)
 
         if self.openai_api_key is None:
             raise ValueError(
@@ -19,31 +53,131 @@ class EmbeddingModel:
             )
         openai.api_key = self.openai_api_key
         self.embeddings_model_name = embeddings_model_name
+        self.dimensions = dimensions
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.token_counter = token_counter
 
-    async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        embedding_response = await self.async_client.embeddings.create(
-            input=list_of_text, model=self.embeddings_model_name
-        )
+    def _request_kwargs(self) -> dict:
+        kwargs = {"model": self.embeddings_model_name}
+        if self.dimensions is not None:
+            kwargs["dimensions"] = self.dimensions
+        return kwargs
+
+    def _lookup(
+        self, list_of_text: List[str]
+    ) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        """Splits the inputs into cache hits and the unique texts still to embed."""
+        keys = [
+            self.cache.make_key(self.embeddings_model_name, self.dimensions, text)
+            for text in list_of_text
+        ]
+        found = self.cache.get_many(keys)
+        missing = {
+            key: text for key, text in zip(keys, list_of_text) if key not in found
+        }
+        return keys, found, list(missing.values())
+
+    def _merge(
+        self,
+        keys: List[str],
+        found: Dict[str, List[float]],
+        missing: List[str],
+        embeddings: List[List[float]],
+    ) -> List[List[float]]:
+        """Stores freshly fetched embeddings and returns all of them in input order."""
+        fetched = {
+            self.cache.make_key(self.embeddings_model_name, self.dimensions, text): embedding
+            for text, embedding in zip(missing, embeddings)
+        }
+        if fetched:
+            self.cache.put_many(fetched)
+        found.update(fetched)
+        return [found[key] for key in keys]
+
+    def _batches(self, list_of_text: List[str]) -> Iterator[List[str]]:
+        """Splits inputs into consecutive batches capped by item and token count."""
+        batch, batch_tokens = [], 0
+        for text in list_of_text:
+            tokens = self.token_counter(text)
+            if batch and (
+                len(batch) >= self.batch_size
+                or batch_tokens + tokens > self.max_batch_tokens
+            ):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(60.0, 0.5 * 2**attempt))
+
+    async def _async_request_batch(
+        self, batch: List[str], semaphore: asyncio.Semaphore
+    ) -> List[List[float]]:
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    embedding_response = await self.async_client.embeddings.create(
+                        input=batch, **self._request_kwargs()
+                    )
+                    break
+                except Exception as error:
+                    if attempt == self.max_retries or not _is_retryable(error):
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
 
         return [embeddings.embedding for embeddings in embedding_response.data]
 
-    async def async_get_embedding(self, text: str) -> List[float]:
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
+    async def _async_request_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        batches = await asyncio.gather(
+            *(
+                self._async_request_batch(batch, semaphore)
+                for batch in self._batches(list_of_text)
+            )
         )
+        return [embedding for batch in batches for embedding in batch]
 
-        return embedding.data[0].embedding
+    def _request_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        embeddings = []
+        for batch in self._batches(list_of_text):
+            embedding_response = self.client.embeddings.create(
+                input=batch, **self._request_kwargs()
+            )
+            embeddings.extend(item.embedding for item in embedding_response.data)
+        return embeddings
+
+    async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return await self._async_request_embeddings(list_of_text)
+
+        keys, found, missing = self._lookup(list_of_text)
+        embeddings = await self._async_request_embeddings(missing) if missing else []
+        return self._merge(keys, found, missing, embeddings)
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return (await self.async_get_embeddings([text]))[0]
 
     def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        embedding_response = self.client.embeddings.create(
-            input=list_of_text, model=self.embeddings_model_name
-        )
+        if self.cache is None:
+            return self._request_embeddings(list_of_text)
 
-        return [embeddings.embedding for embeddings in embedding_response.data]
+        keys, found, missing = self._lookup(list_of_text)
+        embeddings = self._request_embeddings(missing) if missing else []
+        return self._merge(keys, found, missing, embeddings)
 
     def get_embedding(self, text: str) -> List[float]:
+        if self.cache is not None:
+            return self.get_embeddings([text])[0]
+
         embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
+            input=text, **self._request_kwargs()
         )
 
         return embedding.data[0].embedding
@@ -0,0 +1,102 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by a hash of (model name, dimensions, text) and stored as
+    float32 blobs. When `max_entries` is set the least recently used entries
+    are evicted once the cache grows past it.
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_entries: int = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._clock = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(model_name: str, dimensions: Optional[int], text: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{model_name}\0{dimensions or ''}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Returns the cached embeddings for whichever of `keys` are present."""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._clock += 1
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found],
+                )
+                self._connection.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._clock += 1
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes(), self._clock)
+                    for key, vector in items.items()
+                ],
+            )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings "
+                    "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM embeddings")
+            self._connection.commit()
+            self.hits = self.misses = 0
+
+    def close(self) -> None:
+        self._connection.close()
@@ -1,4 +1,17 @@
-import re
+import string
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_FORMATTER = string.Formatter()
+
+
+def compile_template(prompt: str) -> List[Tuple[str, Optional[str], str, Optional[str]]]:
+    """
+    Splits a `str.format`-style template into (literal, field, format_spec,
+    conversion) segments once, so rendering is a join with no re-parsing.
+    `{{` / `}}` escapes end up in the literals; `field` is None for a
+    trailing literal.
+    """
+    return list(_FORMATTER.parse(prompt))
 
 
 class BasePrompt:
@@ -9,7 +22,21 @@ class BasePrompt:
         :param prompt: A string that can contain placeholders within curly braces
         """
         self.prompt = prompt
-        self._pattern = re.compile(r"\{([^}]+)\}")
+        self._segments = compile_template(prompt)
+        self._variables = [field for _, field, _, _ in self._segments if field is not None]
+        self._required = frozenset(self._variables)
+
+    def _render(self, values: Dict, default=None) -> str:
+        pieces = []
+        for literal, field, format_spec, conversion in self._segments:
+            pieces.append(literal)
+            if field is None:
+                continue
+            value = values[field] if default is None else values.get(field, default)
+            if conversion is not None:
+                value = _FORMATTER.convert_field(value, conversion)
+            pieces.append(format(value, format_spec) if format_spec else str(value))
+        return "".join(pieces)
 
     def format_prompt(self, **kwargs):
         """
@@ -18,8 +45,25 @@ class BasePrompt:
         :param kwargs: The values to substitute into the prompt string
         :return: The formatted prompt string
         """
-        matches = self._pattern.findall(self.prompt)
-        return self.prompt.format(**{match: kwargs.get(match, "") for match in matches})
+        return self._render(kwargs, default="")
+
+    def format_many(self, variables: Iterable[Dict], strict: bool = True) -> List[str]:
+        """
+        Formats the prompt once per dict of variables.
+
+        :param variables: One dict of substitution values per prompt
+        :param strict: Raise a ValueError before rendering anything if any dict
+            lacks a variable; otherwise missing variables render as ""
+        :return: The formatted prompt strings
+        """
+        variables = list(variables)
+        if not strict:
+            return [self._render(values, default="") for values in variables]
+        for index, values in enumerate(variables):
+            if not self._required.issubset(values):
+                missing = sorted(self._required.difference(values))
+                raise ValueError(f"Prompt variables {missing} missing from item {index}")
+        return [self._render(values) for values in variables]
 
     def get_input_variables(self):
         """
@@ -27,7 +71,7 @@ class BasePrompt:
 
         :return: List of input variable names
         """
-        return self._pattern.findall(self.prompt)
+        return list(self._variables)
 
 
 class RolePrompt(BasePrompt):
@@ -53,6 +97,18 @@ class RolePrompt(BasePrompt):
         
         return {"role": self.role, "content": self.prompt}
 
+    def create_messages_batch(self, variables: Iterable[Dict], strict: bool = True) -> List[Dict]:
+        """
+        Creates one message per dict of variables, see `format_many`.
+
+        :return: List of dictionaries containing the role and formatted message
+        """
+        role = self.role
+        return [
+            {"role": role, "content": content}
+            for content in self.format_many(variables, strict)
+        ]
+
 
 class SystemRolePrompt(RolePrompt):
     def __init__(self, prompt: str):
@@ -76,3 +132,4 @@ if __name__ == "__main__":
     prompt = SystemRolePrompt("Hello {name}, you are {age} years old")
     print(prompt.create_message(name="John", age=30))
     print(prompt.get_input_variables())
+    print(prompt.create_messages_batch([{"name": "John", "age": 30}, {"name": "Jane", "age": 25}]))
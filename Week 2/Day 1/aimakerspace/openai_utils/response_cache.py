@@ -0,0 +1,246 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional
+import numpy as np
+
+if TYPE_CHECKING:
+    from aimakerspace.vectordatabase import VectorDatabase
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _last_user_index(messages: List[Dict]) -> Optional[int]:
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return index
+    return None
+
+
+def _last_user_message(messages: List[Dict]) -> Optional[str]:
+    index = _last_user_index(messages)
+    return None if index is None else messages[index]["content"]
+
+
+class ResponseCache:
+    """
+    Chat completion cache backed by SQLite, with an optional semantic tier.
+
+    The exact tier is keyed by a hash of (model, messages, sampling kwargs).
+    When a `semantic_index` is given, misses fall back to a nearest-neighbour
+    search over the embeddings of past user questions asked with the same
+    model, kwargs and surrounding messages (system prompt and history, i.e.
+    everything but the last user turn); a neighbour at or above `similarity_threshold` (cosine)
+    is served as a hit. Entries expire after `ttl` seconds and, when
+    `max_entries` is set, the least recently used ones are evicted.
+
+    :param path: SQLite file to persist entries in; ":memory:" keeps them in
+        the process only. Stored question embeddings are re-added to the
+        semantic index on open.
+    :param semantic_index: Empty `VectorDatabase` whose embedding model
+        embeds the questions
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_entries: int = None,
+        ttl: float = None,
+        semantic_index: "VectorDatabase" = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_index = semantic_index
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # float32 question embeddings computed on a miss, reused when the
+        # answer is put; dropped on a semantic hit.
+        self._pending_vectors: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, "
+            "scope TEXT NOT NULL, query TEXT, vector BLOB, response TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_created ON responses (created)"
+        )
+        self._clock = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0) FROM responses"
+        ).fetchone()[0]
+        self._expire()
+        if semantic_index is not None:
+            rows = self._connection.execute(
+                "SELECT key, scope, query, vector FROM responses WHERE vector IS NOT NULL"
+            )
+            for key, scope, query, blob in rows:
+                semantic_index.insert(
+                    key, np.frombuffer(blob, dtype=np.float32), query, {"scope": scope}
+                )
+
+    @staticmethod
+    def make_key(model_name: str, messages: List[Dict], kwargs: Dict) -> str:
+        return _digest(model_name, messages, kwargs)
+
+    @staticmethod
+    def make_scope(model_name: str, messages: List[Dict], kwargs: Dict) -> str:
+        """Hash of the request minus its last user turn; semantic hits must match it."""
+        index = _last_user_index(messages)
+        context = messages if index is None else messages[:index] + messages[index + 1 :]
+        return _digest(model_name, context, kwargs)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.semantic_hits + self.misses
+        return (self.hits + self.semantic_hits) / total if total else 0.0
+
+    def _delete(self, keys: List[str]) -> None:
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+        if self.semantic_index is not None:
+            for key in keys:
+                self.semantic_index.delete(key)
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        expired = self._connection.execute(
+            "SELECT key FROM responses WHERE created < ?", (time.time() - self.ttl,)
+        ).fetchall()
+        if expired:
+            self._delete([key for key, in expired])
+            self._connection.commit()
+
+    def _fetch(self, key: str) -> Optional[str]:
+        row = self._connection.execute(
+            "SELECT response, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        response, created = row
+        if self.ttl is not None and created < time.time() - self.ttl:
+            self._delete([key])
+            self._connection.commit()
+            return None
+        self._clock += 1
+        self._connection.execute(
+            "UPDATE responses SET last_used = ? WHERE key = ?", (self._clock, key)
+        )
+        self._connection.commit()
+        return response
+
+    def _semantic_query(self, messages: List[Dict]) -> Optional[str]:
+        return None if self.semantic_index is None else _last_user_message(messages)
+
+    def _get_exact(self, key: str) -> Optional[str]:
+        with self._lock:
+            response = self._fetch(key)
+        if response is not None:
+            self.hits += 1
+        return response
+
+    def _get_semantic(
+        self, key: str, model_name: str, messages: List[Dict], kwargs: Dict, vector: List[float]
+    ) -> Optional[str]:
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            hits = self.semantic_index.search(
+                vector, k=1, filter={"scope": self.make_scope(model_name, messages, kwargs)}
+            )
+            response = None
+            if hits and hits[0][1] >= self.similarity_threshold:
+                response = self._fetch(hits[0][0])
+            if response is None:
+                self._pending_vectors[key] = vector
+                while len(self._pending_vectors) > 1024:
+                    self._pending_vectors.popitem(last=False)
+        if response is not None:
+            self.semantic_hits += 1
+        return response
+
+    def get(self, model_name: str, messages: List[Dict], **kwargs) -> Optional[str]:
+        """Returns a cached response for this request, or None on a miss."""
+        key = self.make_key(model_name, messages, kwargs)
+        response = self._get_exact(key)
+        query = self._semantic_query(messages)
+        if response is None and query is not None:
+            vector = self.semantic_index.embedding_model.get_embedding(query)
+            response = self._get_semantic(key, model_name, messages, kwargs, vector)
+        if response is None:
+            self.misses += 1
+        return response
+
+    async def aget(self, model_name: str, messages: List[Dict], **kwargs) -> Optional[str]:
+        key = self.make_key(model_name, messages, kwargs)
+        response = self._get_exact(key)
+        query = self._semantic_query(messages)
+        if response is None and query is not None:
+            vector = await self.semantic_index.embedding_model.async_get_embedding(query)
+            response = self._get_semantic(key, model_name, messages, kwargs, vector)
+        if response is None:
+            self.misses += 1
+        return response
+
+    def put(self, model_name: str, messages: List[Dict], response: str, **kwargs) -> None:
+        key = self.make_key(model_name, messages, kwargs)
+        scope = self.make_scope(model_name, messages, kwargs)
+        query = _last_user_message(messages)
+        with self._lock:
+            vector = self._pending_vectors.pop(key, None)
+            self._clock += 1
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, scope, query, vector, response, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    scope,
+                    query,
+                    None if vector is None else vector.tobytes(),
+                    response,
+                    time.time(),
+                    self._clock,
+                ),
+            )
+            if vector is not None:
+                self.semantic_index.insert(key, vector, query, {"scope": scope})
+            if self.max_entries is not None:
+                evicted = self._connection.execute(
+                    "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                    (self.max_entries,),
+                ).fetchall()
+                if evicted:
+                    self._delete([key for key, in evicted])
+            self._expire()
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._delete(
+                [key for key, in self._connection.execute("SELECT key FROM responses")]
+            )
+            self._connection.commit()
+            self._pending_vectors.clear()
+            self.hits = self.semantic_hits = self.misses = 0
+
+    def close(self) -> None:
+        self._connection.close()
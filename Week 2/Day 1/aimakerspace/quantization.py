@@ -0,0 +1,45 @@
+from typing import Tuple
+import numpy as np
+
+STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "int8": np.int8,
+}
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scalar-quantizes rows to int8 with one float32 scale per row.
+
+    Each row is scaled so its largest absolute component maps to 127, which
+    keeps the per-row quantization error independent of other rows and lets
+    rows be quantized one at a time as they are inserted.
+
+    :return: (codes, scales) where `codes * scales[:, None]` approximates `vectors`
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def matmul_blocked(
+    queries: np.ndarray, stored: np.ndarray, block_bytes: int = 1 << 19
+) -> np.ndarray:
+    """
+    `queries @ stored.T` for low-precision `stored` matrices.
+
+    NumPy upcasts float16/int8 operands to a float32 temporary. Working in
+    blocks whose temporary is about `block_bytes` keeps it in cache; large
+    blocks spill to main memory and make the scan several times slower.
+    """
+    if stored.dtype == np.float32:
+        return queries @ stored.T
+    block = max(1, block_bytes // (4 * max(1, stored.shape[1])))
+    scores = np.empty((len(queries), len(stored)), dtype=np.float32)
+    for start in range(0, len(stored), block):
+        chunk = stored[start : start + block].astype(np.float32)
+        scores[:, start : start + block] = queries @ chunk.T
+    return scores
@@ -1,12 +1,39 @@
 import os
-from typing import List
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
 import fitz
 
+
+def read_pdf_pages(file_path: str) -> List[str]:
+    """Returns the text of every page of a PDF. Module-level so worker processes can pickle it."""
+    with fitz.open(file_path) as document:
+        return [page.get_text() for page in document]
+
+
 class TextFileLoader:
-    def __init__(self, path: str, encoding: str = "utf-8"):
+    """
+    Loads .txt and .pdf files into `self.documents`.
+
+    :param max_workers: When greater than 1, `load_directory` parses PDFs in a
+        process pool of this size; output order stays the sorted file order
+    :param split_pages: Emit one document per PDF page instead of per file
+    """
+
+    def __init__(
+        self,
+        path: str,
+        encoding: str = "utf-8",
+        max_workers: int = None,
+        split_pages: bool = False,
+    ):
         self.documents = []
+        self.metadata: List[Dict] = []
         self.path = path
         self.encoding = encoding
+        self.max_workers = max_workers
+        self.split_pages = split_pages
 
     def load(self):
         if os.path.isdir(self.path):
@@ -20,33 +47,119 @@ class TextFileLoader:
                 f"Provided path {self.path} is neither a valid directory, a .pdf file, nor a .txt file."
             )
 
-    def load_pdf_file(self, file_path):
+    def read_file(self, file_path) -> str:
+        print(f"Loading text file: {file_path}")
+        with open(file_path, "r", encoding=self.encoding) as f:
+            return f.read()
+
+    def _pdf_records(self, file_path, pages: List[str] = None) -> List[Tuple[str, Dict]]:
+        """:param pages: Already parsed page texts (from a worker process); read here if None"""
         print(f"Loading PDF file: {file_path}")
-        document = fitz.open(file_path)
-        text = ""
-        for page in document:
-            text += page.get_text()
-        self.documents.append(text)
+        if pages is None:
+            pages = read_pdf_pages(file_path)
+        if self.split_pages:
+            return [
+                (text, {"source": file_path, "page": number})
+                for number, text in enumerate(pages, start=1)
+            ]
+        return [("".join(pages), {"source": file_path})]
+
+    def _records(self, file_path) -> List[Tuple[str, Dict]]:
+        if file_path.endswith(".pdf"):
+            return self._pdf_records(file_path)
+        return [(self.read_file(file_path), {"source": file_path})]
+
+    def _append(self, records: List[Tuple[str, Dict]]) -> None:
+        for text, metadata in records:
+            self.documents.append(text)
+            self.metadata.append(metadata)
+
+    def load_pdf_file(self, file_path):
+        self._append(self._records(file_path))
     
     def load_file(self, file_path):
-        print(f"Loading text file: {file_path}")
-        with open(file_path, "r", encoding=self.encoding) as f:
-            self.documents.append(f.read())
+        self._append(self._records(file_path))
+
+    def iter_files(self) -> Iterator[str]:
+        """Yields the paths of the .txt and .pdf files under `self.path`, in sorted order."""
+        if os.path.isdir(self.path):
+            for root, dirs, files in os.walk(self.path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.endswith((".txt", ".pdf")):
+                        yield os.path.join(root, file)
+        elif os.path.isfile(self.path) and self.path.endswith((".txt", ".pdf")):
+            yield self.path
+        else:
+            raise ValueError(
+                f"Provided path {self.path} is neither a valid directory, a .pdf file, nor a .txt file."
+            )
+
+    def iter_documents(self) -> Iterator[str]:
+        """
+        Lazily yields one document at a time without storing it in
+        `self.documents`, so only the file being read is held in memory.
+        """
+        for file_path in self.iter_files():
+            for text, _ in self._records(file_path):
+                yield text
 
     def load_directory(self):
-        for root, _, files in os.walk(self.path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if file.endswith(".txt"):
-                    self.load_file(file_path)
-                elif file.endswith(".pdf"):
-                    self.load_pdf_file(file_path)
+        file_paths = list(self.iter_files())
+        if not self.max_workers or self.max_workers <= 1:
+            for file_path in file_paths:
+                self._append(self._records(file_path))
+            return
+
+        pdf_paths = [file_path for file_path in file_paths if file_path.endswith(".pdf")]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            # map() yields results in submission order, so the output is deterministic.
+            parsed = executor.map(read_pdf_pages, pdf_paths)
+            for file_path in file_paths:
+                if file_path.endswith(".pdf"):
+                    self._append(self._pdf_records(file_path, next(parsed)))
+                else:
+                    self._append(self._records(file_path))
 
     def load_documents(self):
         self.load()
         return self.documents
 
 
+class ChunkSpans:
+    """
+    Chunks stored as (doc_id, start, end) offsets into the original texts.
+
+    Offsets live in compact typed arrays and a chunk's string is only sliced
+    out when it is indexed or iterated, so building spans copies no text.
+    """
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.doc_ids = array("i")
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __getitem__(self, index: int) -> str:
+        doc_id, start, end = self.span(index)
+        return self.texts[doc_id][start:end]
+
+    def __iter__(self) -> Iterator[str]:
+        for doc_id, start, end in zip(self.doc_ids, self.starts, self.ends):
+            yield self.texts[doc_id][start:end]
+
+    def span(self, index: int) -> Tuple[int, int, int]:
+        return self.doc_ids[index], self.starts[index], self.ends[index]
+
+    def metadata(self, index: int) -> Dict:
+        """Source offsets for citing the chunk at `index`."""
+        doc_id, start, end = self.span(index)
+        return {"doc_id": doc_id, "start": start, "end": end}
+
+
 class CharacterTextSplitter:
     def __init__(
         self,
@@ -72,6 +185,91 @@ class CharacterTextSplitter:
             chunks.extend(self.split(text))
         return chunks
 
+    def split_spans(self, texts: List[str]) -> ChunkSpans:
+        """Same chunks as `split_texts`, returned as offsets instead of copies."""
+        step = self.chunk_size - self.chunk_overlap
+        spans = ChunkSpans(texts)
+        for doc_id, text in enumerate(texts):
+            starts = range(0, len(text), step)
+            spans.doc_ids.extend([doc_id] * len(starts))
+            spans.starts.extend(starts)
+            spans.ends.extend(min(start + self.chunk_size, len(text)) for start in starts)
+        return spans
+
+    def iter_split(self, texts: Iterable[str]) -> Iterator[str]:
+        """Lazily yields the chunks of each text as the texts are consumed."""
+        step = self.chunk_size - self.chunk_overlap
+        for text in texts:
+            for i in range(0, len(text), step):
+                yield text[i : i + self.chunk_size]
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str = "gpt-4o"):
+    """
+    Returns the tiktoken encoding for a model (or encoding name), loading it
+    only once per process.
+    """
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding(model_name)
+
+
+def token_length(text: str, model_name: str = "gpt-4o") -> int:
+    """Drop-in `length_function` that reuses the cached encoding."""
+    return len(get_encoding(model_name).encode(text, disallowed_special=()))
+
+
+class TokenTextSplitter:
+    """
+    Splits texts into windows of `chunk_size` tokens overlapping by
+    `chunk_overlap` tokens.
+
+    Each text is encoded exactly once and chunks are cut on token boundaries
+    of that encoding, instead of re-measuring candidate strings.
+
+    :param num_threads: Threads used by `split_texts` to encode and decode
+        the corpus in batches
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 50,
+        model_name: str = "gpt-4o",
+        num_threads: int = 8,
+    ):
+        assert (
+            chunk_size > chunk_overlap
+        ), "Chunk size must be greater than chunk overlap"
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.model_name = model_name
+        self.num_threads = num_threads
+
+    @property
+    def encoding(self):
+        return get_encoding(self.model_name)
+
+    def _windows(self, tokens: List[int]) -> List[List[int]]:
+        step = self.chunk_size - self.chunk_overlap
+        return [tokens[i : i + self.chunk_size] for i in range(0, len(tokens), step)]
+
+    def split(self, text: str) -> List[str]:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return [self.encoding.decode(window) for window in self._windows(tokens)]
+
+    def split_texts(self, texts: List[str]) -> List[str]:
+        encoded = self.encoding.encode_batch(
+            texts, num_threads=self.num_threads, disallowed_special=()
+        )
+        windows = [window for tokens in encoded for window in self._windows(tokens)]
+        return self.encoding.decode_batch(windows, num_threads=self.num_threads)
+
 
 if __name__ == "__main__":
     # List all files in the current directory to confirm the presence of AlmanackNaval.pdf
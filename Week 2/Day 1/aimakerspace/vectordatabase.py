@@ -1,7 +1,16 @@
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable
+import itertools
+import json
+import os
+import tempfile
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple, Callable, Union
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.bm25 import BM25Index
+from aimakerspace.dedup import MinHashDeduplicator
+from aimakerspace.ivf import IVFIndex
+from aimakerspace.metadata import Filter, MetadataIndex, matches_filter
+from aimakerspace.quantization import STORAGE_DTYPES, matmul_blocked, quantize_int8
 import asyncio
 import math
 
@@ -13,46 +22,836 @@ def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+def dot_product(vector_a: np.array, vector_b: np.array) -> float:
+    """Computes the dot product between two vectors."""
+    return np.dot(vector_a, vector_b)
+
+
+def euclidean_distance(vector_a: np.array, vector_b: np.array) -> float:
+    """Computes the L2 distance between two vectors."""
+    return np.linalg.norm(np.asarray(vector_a) - np.asarray(vector_b))
+
+
+# Vectorized metrics understood by the matrix engine. Each maps to the scalar
+# function above so that passing e.g. `cosine_similarity` as the
+# `distance_measure` still takes the fast path.
+METRICS = {
+    "cosine": cosine_similarity,
+    "dot": dot_product,
+    "l2": euclidean_distance,
+}
+_METRIC_NAMES = {function: name for name, function in METRICS.items()}
+
+
+def _resolve_metric(distance_measure: Union[str, Callable]) -> Union[str, None]:
+    """Returns the vectorized metric name, or None for a custom callable."""
+    if isinstance(distance_measure, str):
+        if distance_measure not in METRICS:
+            raise ValueError(
+                f"Unknown metric {distance_measure!r}, expected one of {sorted(METRICS)}"
+            )
+        return distance_measure
+    return _METRIC_NAMES.get(distance_measure)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting every score."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    ranked = -scores
+    if k < scores.size:
+        candidates = np.argpartition(ranked, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(ranked[candidates], kind="stable")]
+
+
+def _saved_codes_match(path: str, storage: str, rows: int) -> bool:
+    """Whether `path` holds quantized codes written for this storage type."""
+    codes_path = os.path.join(path, "codes.npy")
+    if not os.path.exists(codes_path):
+        return False
+    codes = np.load(codes_path, mmap_mode="r")
+    if storage == "int8" and not os.path.exists(os.path.join(path, "scales.npy")):
+        return False
+    return codes.dtype == STORAGE_DTYPES[storage] and len(codes) == rows
+
+
+def _reciprocal_rank_fusion(
+    rankings: List[List[Tuple[str, float]]], k: int, rrf_k: int = 60
+) -> List[Tuple[str, float]]:
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (key, _) in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
 class VectorDatabase:
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = defaultdict(np.array)
+    """
+    Stores embeddings row-wise in a single matrix.
+
+    Every row is kept L2-normalized alongside its original norm, so cosine
+    scores are a single matrix-vector product and dot-product / L2 scores are
+    recovered from the same matrix without a second copy of the data.
+
+    An optional approximate `index` (see `aimakerspace.ivf.IVFIndex`) narrows
+    each query to a candidate subset before exact scoring; searches fall back
+    to a full scan while the index is untrained.
+
+    :param storage: "float32" (default), "float16" or "int8". The quantized
+        types trade scan speed for memory: rows are upcast block by block
+        before scoring, so a full scan is slower than with float32. int8
+        rows are scalar-quantized with a per-row scale and only the codes and
+        scales are held in memory. The normalized float32 rows stay on disk (in
+        `vectors.npy` after `load`, inserted rows in an anonymous spill file)
+        and the top `rescore * k` quantized hits are re-scored against them.
+    :param rescore: Candidate multiplier for int8 re-scoring; 0 disables it
+    :param indexed_fields: Metadata fields to keep inverted indexes for, so
+        search filters on them only score the matching rows
+    :param lexical_index: Optional `BM25Index` fed with every record's text,
+        enabling "lexical" and "hybrid" modes in `search_by_text`
+    :param search_mode: Default `search_by_text` mode: "vector", "lexical"
+        (no embedding request at all) or "hybrid" (reciprocal rank fusion)
+    :param compaction_threshold: Tombstoned fraction of rows above which
+        `compact` runs automatically; None disables it
+    """
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        index: IVFIndex = None,
+        storage: str = "float32",
+        rescore: int = 4,
+        indexed_fields: Iterable[str] = (),
+        lexical_index: BM25Index = None,
+        search_mode: str = "vector",
+        compaction_threshold: Optional[float] = 0.25,
+    ):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(
+                f"Unknown storage {storage!r}, expected one of {sorted(STORAGE_DTYPES)}"
+            )
+        if search_mode != "vector" and lexical_index is None:
+            raise ValueError(f"search_mode {search_mode!r} requires a lexical_index")
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.index = index
+        self.storage = storage
+        self.rescore = rescore
+        self._matrix = np.empty((0, 0), dtype=STORAGE_DTYPES[storage])
+        self._norms = np.empty(0, dtype=np.float32)
+        self._scales = np.empty(0, dtype=np.float32) if storage == "int8" else None
+        # int8 only: where each row's float32 vector lives on disk, a row of
+        # the memory-mapped `_full` (>= 0) or of the spill file (-1 - row).
+        self._full_rows = np.empty(0, dtype=np.int64) if storage == "int8" else None
+        self._full = None
+        self._spill = None
+        self._spill_count = 0
+        self._spill_map = None
+        self.metadata_index = MetadataIndex(indexed_fields)
+        self.lexical_index = lexical_index
+        self.search_mode = search_mode
+        self.compaction_threshold = compaction_threshold
+        self._keys: List[str] = []
+        self._texts: List[str] = []
+        self._metadata: List[Optional[Dict]] = []
+        self._rows: Dict[str, int] = {}
+        self._tombstones: List[int] = []
+        # Keys of deduplicated chunks -> key of their cluster representative.
+        self._aliases: Dict[str, str] = {}
+        # Representative key -> its aliases, in the order they were added.
+        self._alias_groups: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def _size(self) -> int:
+        """Rows used in the matrix, including deleted ones."""
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return self._row_of(key) is not None
+
+    def _row_of(self, key: str) -> Optional[int]:
+        row = self._rows.get(key)
+        if row is None and key in self._aliases:
+            row = self._rows.get(self._aliases[key])
+        return row
+
+    def resolve(self, key: str) -> str:
+        """Returns the representative key a deduplicated key was mapped to."""
+        return key if key in self._rows else self._aliases.get(key, key)
 
-    def insert(self, key: str, vector: np.array) -> None:
-        self.vectors[key] = vector
+    def _add_alias(self, alias: str, representative: str) -> None:
+        self._remove_alias(alias)
+        self._aliases[alias] = representative
+        self._alias_groups.setdefault(representative, []).append(alias)
+
+    def _remove_alias(self, alias: str) -> bool:
+        representative = self._aliases.pop(alias, None)
+        if representative is None:
+            return False
+        group = self._alias_groups[representative]
+        group.remove(alias)
+        if not group:
+            del self._alias_groups[representative]
+        return True
+
+    def _promote_alias(self, key: str) -> bool:
+        """
+        Hands the row of a representative that is being replaced or deleted
+        to its first alias, which becomes the representative of the others.
+        """
+        aliases = self._alias_groups.pop(key, None)
+        if not aliases:
+            return False
+        heir, others = aliases[0], aliases[1:]
+        del self._aliases[heir]
+        row = self._rows.pop(key)
+        self._keys[row] = heir
+        self._rows[heir] = row
+        for alias in others:
+            self._aliases[alias] = heir
+        if others:
+            self._alias_groups[heir] = others
+        return True
+
+    @property
+    def dimension(self) -> int:
+        return self._matrix.shape[1]
+
+    @property
+    def vectors(self) -> Dict[str, np.ndarray]:
+        return {key: self.retrieve_from_key(key) for key in self._rows}
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"_matrix": self._matrix, "_norms": self._norms}
+        if self._scales is not None:
+            arrays["_scales"] = self._scales
+        if self._full_rows is not None:
+            arrays["_full_rows"] = self._full_rows
+        return arrays
+
+    def _reserve(self, dimension: int, capacity: int) -> None:
+        if self._size == 0 and self._matrix.shape[1] != dimension:
+            for name, array in self._arrays().items():
+                if array.ndim == 2:
+                    setattr(self, name, np.empty((0, dimension), dtype=array.dtype))
+            # Earlier spilled rows (all deleted) have the old dimension.
+            self._spill, self._spill_count, self._spill_map = None, 0, None
+        elif dimension != self.dimension:
+            raise ValueError(
+                f"Vector has dimension {dimension}, database expects {self.dimension}"
+            )
+        arrays = self._arrays()
+        if capacity <= self._matrix.shape[0] and all(
+            array.flags.writeable for array in arrays.values()
+        ):
+            return
+        # Growing (or the first write to a read-only memory map) copies into RAM.
+        capacity = max(capacity, 2 * self._size, 16)
+        for name, array in arrays.items():
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[: self._size] = array[: self._size]
+            setattr(self, name, grown)
+
+    def _normalized(self, rows=slice(None)) -> np.ndarray:
+        """Best available float32 copy of the normalized vectors at `rows`."""
+        if self._matrix.dtype == np.float32:
+            return self._matrix[: self._size][rows]
+        if self._full_rows is not None:
+            source = self._full_rows[: self._size][rows]
+            if np.ndim(source) == 0:
+                return self._read_full(source[None])[0]
+            return self._read_full(source)
+        return self._matrix[: self._size][rows].astype(np.float32)
+
+    def _read_full(self, source: np.ndarray) -> np.ndarray:
+        """Reads int8 rows' float32 vectors from disk; `source` as in `_full_rows`."""
+        vectors = np.empty((len(source), self.dimension), dtype=np.float32)
+        loaded = source >= 0
+        if loaded.any():
+            vectors[loaded] = self._full[source[loaded]]
+        if not loaded.all():
+            if self._spill_map is None or len(self._spill_map) < self._spill_count:
+                self._spill.flush()
+                self._spill_map = np.memmap(
+                    self._spill,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(self._spill_count, self.dimension),
+                )
+            vectors[~loaded] = self._spill_map[-1 - source[~loaded]]
+        return vectors
+
+    def _write_spill(self, vector: np.ndarray) -> int:
+        """Appends a float32 row to the spill file and returns its `_full_rows` entry."""
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="vectordb-", suffix=".f32")
+        self._spill.seek(0, os.SEEK_END)
+        self._spill.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+        self._spill_count += 1
+        return -self._spill_count
+
+    def upsert(
+        self, key: str, vector: np.array, text: str = None, metadata: Dict = None
+    ) -> None:
+        """
+        Adds or replaces the record stored under `key`.
+
+        An existing record is tombstoned and the new version appended, so
+        updates never rewrite rows in place and every side index stays
+        append-only; `compact` later reclaims the dead rows.
+
+        :param text: The record's text, defaults to the key itself
+        :param metadata: Optional dict that search filters are evaluated against
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        text = key if text is None else text
+        self._reserve(vector.shape[0], self._size + 1)
+        if not self._promote_alias(key):
+            self._tombstone(key)
+        self._remove_alias(key)
+        row = self._size
+        self._keys.append(key)
+        self._texts.append(text)
+        self._metadata.append(metadata)
+        self._rows[key] = row
+        self.metadata_index.add(row, metadata)
+        if self.lexical_index is not None:
+            self.lexical_index.add(row, text)
+        norm = np.linalg.norm(vector)
+        normalized = vector / norm if norm > 0 else vector
+        self._norms[row] = norm
+        if self.storage == "int8":
+            codes, scales = quantize_int8(normalized)
+            self._matrix[row], self._scales[row] = codes[0], scales[0]
+            self._full_rows[row] = self._write_spill(normalized)
+        else:
+            self._matrix[row] = normalized
+        if self.index is not None:
+            self.index.add(row, normalized)
+            if self.index.needs_retrain:
+                self.rebuild_index()
+        self._maybe_compact()
+
+    def insert(
+        self, key: str, vector: np.array, text: str = None, metadata: Dict = None
+    ) -> None:
+        self.upsert(key, vector, text, metadata)
+
+    def _tombstone(self, key: str) -> bool:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        self.metadata_index.remove(row, self._metadata[row])
+        self._keys[row] = self._texts[row] = self._metadata[row] = None
+        self._tombstones.append(row)
+        if self.index is not None:
+            self.index.remove(row)
+        if self.lexical_index is not None:
+            self.lexical_index.remove(row)
+        return True
+
+    def delete(self, key: str) -> bool:
+        """
+        Removes a key in O(1) by tombstoning its row; the row's storage is
+        reclaimed by `compact`. A representative with aliases instead hands
+        its row to the first of them.
+
+        :return: Whether the key was present
+        """
+        deleted = (
+            self._promote_alias(key) or self._tombstone(key) or self._remove_alias(key)
+        )
+        self._maybe_compact()
+        return deleted
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return len(self._tombstones) / self._size if self._size else 0.0
+
+    def _maybe_compact(self) -> None:
+        if (
+            self.compaction_threshold is not None
+            and self.tombstone_ratio > self.compaction_threshold
+        ):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Rebuilds the dense storage without tombstoned rows and renumbers the
+        side indexes. Runs automatically once more than
+        `compaction_threshold` of the rows are dead. Memory-mapped arrays are
+        copied into RAM, except int8 re-scoring vectors, which stay on disk;
+        `save` again to move them back to disk.
+        """
+        if not self._tombstones:
+            return
+        live = np.array(sorted(self._rows.values()), dtype=np.int64)
+        row_map = np.full(self._size, -1, dtype=np.int64)
+        row_map[live] = np.arange(len(live))
+
+        for name, array in self._arrays().items():
+            setattr(self, name, array[: self._size][live])
+        self._keys = [self._keys[row] for row in live]
+        self._texts = [self._texts[row] for row in live]
+        self._metadata = [self._metadata[row] for row in live]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._tombstones = []
+
+        self.metadata_index = MetadataIndex(self.metadata_index.fields)
+        for row, metadata in enumerate(self._metadata):
+            self.metadata_index.add(row, metadata)
+        if self.index is not None:
+            self.index.remap(row_map)
+        if self.lexical_index is not None:
+            self.lexical_index.compact(row_map)
+
+    def rebuild_index(self) -> None:
+        """Retrains the approximate index on every stored vector."""
+        if self.index is not None and len(self) > 0:
+            rows = np.fromiter(self._rows.values(), dtype=np.int64)
+            self.index.train(rows, self._normalized(rows))
+
+    def _scores(
+        self,
+        query_vectors: np.ndarray,
+        metric: str,
+        rows: np.ndarray = None,
+        exact: bool = False,
+    ) -> np.ndarray:
+        """
+        Scores a (queries, dim) matrix against the stored vectors; higher is better.
+
+        :param rows: Only score these rows instead of the whole matrix
+        :param exact: Score against full-precision vectors instead of int8 codes
+        """
+        selection = slice(None) if rows is None else rows
+        norms = self._norms[: self._size][selection]
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        if metric == "cosine":
+            queries = queries / np.where(query_norms > 0, query_norms, 1)
+
+        if exact or self._scales is None:
+            if exact:
+                stored = self._normalized(selection)
+            else:
+                stored = self._matrix[: self._size][selection]
+            scores = matmul_blocked(queries, stored)
+        else:
+            scores = matmul_blocked(queries, self._matrix[: self._size][selection])
+            scores *= self._scales[: self._size][selection]
+
+        if metric != "cosine":
+            scores *= norms
+        if metric == "l2":
+            # Negated squared distance: ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b
+            scores = 2 * scores - norms * norms - query_norms * query_norms
+        if rows is None and self._tombstones:
+            scores[:, self._tombstones] = -np.inf
+        return scores
+
+    def _results(
+        self, scores: np.ndarray, k: int, metric: str, rows: np.ndarray = None
+    ) -> List[Tuple[str, float]]:
+        top = _top_k(scores, k)
+        top = top[np.isfinite(scores[top])]
+        values = scores[top]
+        if metric == "l2":
+            values = np.sqrt(np.maximum(-values, 0))
+        if rows is not None:
+            top = rows[top]
+        return [(self._keys[row], float(value)) for row, value in zip(top, values)]
+
+    @property
+    def _rescoring(self) -> bool:
+        return self._full_rows is not None and self.rescore > 0
+
+    def _rank(
+        self, query_vector: np.ndarray, scores: np.ndarray, k: int, metric: str, rows=None
+    ) -> List[Tuple[str, float]]:
+        """Top-k results, re-scoring quantized candidates at full precision first."""
+        if self._rescoring:
+            top = _top_k(scores, k * self.rescore)
+            top = top[np.isfinite(scores[top])]
+            rows = top if rows is None else rows[top]
+            scores = self._scores(query_vector, metric, rows, exact=True)[0]
+        return self._results(scores, k, metric, rows)
+
+    def _candidates(self, query_vector: np.ndarray, k: int) -> np.ndarray:
+        """Candidate rows from the approximate index, or None for an exact scan."""
+        if self.index is None or not self.index.is_trained:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        rows = self.index.candidates(query / norm if norm > 0 else query)
+        return rows if len(rows) >= k else None
+
+    def _filter_rows(self, filter: Filter) -> np.ndarray:
+        """Live rows whose metadata matches `filter`, narrowed by the inverted indexes."""
+        rows, exact = self.metadata_index.candidate_rows(filter)
+        if rows is None:
+            rows = self._rows.values()
+        if not exact:
+            rows = [row for row in rows if matches_filter(self._metadata[row], filter)]
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def _search_one(
+        self, query_vector: np.ndarray, k: int, metric: str, rows: np.ndarray = None
+    ) -> List[Tuple[str, float]]:
+        if rows is None:
+            rows = self._candidates(query_vector, k)
+        scores = self._scores(query_vector, metric, rows)[0]
+        return self._rank(query_vector, scores, k, metric, rows)
 
     def search(
         self,
         query_vector: np.array,
         k: int,
-        distance_measure: Callable = cosine_similarity,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        filter: Filter = None,
     ) -> List[Tuple[str, float]]:
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in self.vectors.items()
-        ]
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        """
+        :param filter: Metadata filter applied before scoring, e.g.
+            `{"source": "10k.pdf", "year": {"$gte": 2022}}`; see `aimakerspace.metadata`
+        """
+        metric = _resolve_metric(distance_measure)
+        if metric is None:
+            keys = self._rows if filter is None else (
+                self._keys[row] for row in self._filter_rows(filter)
+            )
+            scores = [
+                (key, distance_measure(query_vector, self.retrieve_from_key(key)))
+                for key in keys
+            ]
+            return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+
+        if len(self) == 0:
+            return []
+        if filter is None:
+            return self._search_one(query_vector, k, metric)
+        rows = self._filter_rows(filter)
+        return self._search_one(query_vector, k, metric, rows) if len(rows) else []
+
+    def search_many(
+        self,
+        query_vectors: np.array,
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        batch_size: int = 256,
+        filter: Filter = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Searches several queries at once, scoring each batch of queries as a
+        single query-matrix x corpus-matrix product.
+
+        :param batch_size: Queries scored per product, bounding the size of the
+            (batch_size, len(self)) score matrix held in memory
+        :param filter: Metadata filter shared by every query, resolved once
+        :return: One list of (key, score) results per query, in input order
+        """
+        metric = _resolve_metric(distance_measure)
+        if metric is None or len(self) == 0:
+            return [
+                self.search(query, k, distance_measure, filter) for query in query_vectors
+            ]
+
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        rows = None
+        if filter is not None:
+            rows = self._filter_rows(filter)
+            if len(rows) == 0:
+                return [[] for _ in queries]
+        elif self.index is not None and self.index.is_trained:
+            # Each query probes its own buckets, so candidates are scored per query.
+            return [self._search_one(query, k, metric) for query in queries]
+
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start : start + batch_size]
+            scores = self._scores(batch, metric, rows)
+            results.extend(
+                self._rank(query, row, k, metric, rows) for query, row in zip(batch, scores)
+            )
+        return results
+
+    def lexical_search(
+        self, query_text: str, k: int, filter: Filter = None
+    ) -> List[Tuple[str, float]]:
+        """BM25 keyword search; needs no embedding request."""
+        if self.lexical_index is None:
+            raise ValueError("lexical_search requires a lexical_index")
+        rows = None if filter is None else self._filter_rows(filter)
+        rows, scores = self.lexical_index.search(query_text, k, rows)
+        return [(self._keys[row], float(score)) for row, score in zip(rows, scores)]
 
     def search_by_text(
         self,
         query_text: str,
         k: int,
-        distance_measure: Callable = cosine_similarity,
+        distance_measure: Union[str, Callable] = cosine_similarity,
         return_as_text: bool = False,
+        filter: Filter = None,
+        mode: str = None,
+        rrf_k: int = 60,
     ) -> List[Tuple[str, float]]:
-        query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
-        return [result[0] for result in results] if return_as_text else results
+        """
+        :param mode: Overrides `search_mode`. "hybrid" fuses the vector and
+            lexical rankings with reciprocal rank fusion (scores are the fused
+            `sum(1 / (rrf_k + rank))`).
+        """
+        mode = mode or self.search_mode
+        if mode == "lexical":
+            results = self.lexical_search(query_text, k, filter)
+        elif mode in ("vector", "hybrid"):
+            query_vector = self.embedding_model.get_embedding(query_text)
+            if mode == "vector":
+                results = self.search(query_vector, k, distance_measure, filter)
+            else:
+                # Fuse deeper lists than k so documents ranked well by only
+                # one retriever can still surface.
+                depth = max(k * 4, rrf_k)
+                results = _reciprocal_rank_fusion(
+                    [
+                        self.search(query_vector, depth, distance_measure, filter),
+                        self.lexical_search(query_text, depth, filter),
+                    ],
+                    k,
+                    rrf_k,
+                )
+        else:
+            raise ValueError(f"Unknown search mode {mode!r}")
+        return [self.get_text(result[0]) for result in results] if return_as_text else results
+
+    async def asearch_many_by_text(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Filter = None,
+    ) -> List[List[Tuple[str, float]]]:
+        query_vectors = await self.embedding_model.async_get_embeddings(query_texts)
+        results = self.search_many(query_vectors, k, distance_measure, filter=filter)
+        if return_as_text:
+            return [[self.get_text(result[0]) for result in hits] for hits in results]
+        return results
+
+    def search_many_by_text(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        return_as_text: bool = False,
+        filter: Filter = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Embeds every query text in one batched request, then calls `search_many`."""
+        query_vectors = self.embedding_model.get_embeddings(query_texts)
+        results = self.search_many(query_vectors, k, distance_measure, filter=filter)
+        if return_as_text:
+            return [[self.get_text(result[0]) for result in hits] for hits in results]
+        return results
 
     def retrieve_from_key(self, key: str) -> np.array:
-        return self.vectors.get(key, None)
+        row = self._row_of(key)
+        if row is None:
+            return None
+        return self._normalized(row) * self._norms[row]
+
+    def get_text(self, key: str) -> Optional[str]:
+        row = self._row_of(key)
+        return None if row is None else self._texts[row]
+
+    def get_metadata(self, key: str) -> Optional[Dict]:
+        row = self._row_of(key)
+        return None if row is None else self._metadata[row]
+
+    def save(self, path: str) -> None:
+        """
+        Writes the database to a directory.
+
+        The normalized vectors and their norms are raw float32 `.npy` files that
+        `load` can memory-map; the keys go to a JSON sidecar. float16 / int8
+        databases also write their quantized `codes.npy` (and `scales.npy`).
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {"vectors.npy": self._normalized(), "norms.npy": self._norms[: self._size]}
+        if self.storage != "float32":
+            arrays["codes.npy"] = self._matrix[: self._size]
+        if self._scales is not None:
+            arrays["scales.npy"] = self._scales[: self._size]
+        for name in ("codes.npy", "scales.npy"):
+            if name not in arrays and os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+        # Write to temporary files and rename them into place, so a database
+        # that is memory-mapped from `path` can safely be saved over itself.
+        for name, array in arrays.items():
+            with open(os.path.join(path, name + ".tmp"), "wb") as f:
+                np.save(f, array)
+            os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+        with open(os.path.join(path, "records.json.tmp"), "w", encoding="utf-8") as f:
+            records = {"version": 1, "keys": self._keys}
+            # Texts equal to their key (the default) are stored as null.
+            if any(text != key for key, text in zip(self._keys, self._texts)):
+                records["texts"] = [
+                    None if text == key else text
+                    for key, text in zip(self._keys, self._texts)
+                ]
+            if any(metadata is not None for metadata in self._metadata):
+                records["metadata"] = self._metadata
+            if self._aliases:
+                records["aliases"] = self._aliases
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(
+            os.path.join(path, "records.json.tmp"), os.path.join(path, "records.json")
+        )
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding_model: EmbeddingModel = None,
+        mmap: bool = True,
+        index: IVFIndex = None,
+        storage: str = "float32",
+        rescore: int = 4,
+        indexed_fields: Iterable[str] = (),
+        lexical_index: BM25Index = None,
+        search_mode: str = "vector",
+    ) -> "VectorDatabase":
+        """
+        Opens a database written by `save`.
+
+        :param mmap: Memory-map the vectors read-only instead of reading them
+            into RAM, so opening is near-instant and processes share the page
+            cache. The first insert copies the matrix into memory.
+        :param index: Optional approximate index, trained on the loaded vectors
+        :param storage: In-memory representation, see `VectorDatabase`. For
+            int8 the float32 vectors stay memory-mapped on disk and are only
+            read to re-score candidates.
+        :param lexical_index: Optional `BM25Index`, rebuilt from the saved texts
+        """
+        with open(os.path.join(path, "records.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        if records.get("version") != 1:
+            raise ValueError(f"Unsupported VectorDatabase format in {path}")
 
-    async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
-        embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, np.array(embedding))
+        mmap_mode = "r" if mmap else None
+        vector_db = cls(
+            embedding_model,
+            index,
+            storage,
+            rescore,
+            indexed_fields,
+            lexical_index,
+            search_mode,
+        )
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mmap_mode)
+        vector_db._norms = np.load(os.path.join(path, "norms.npy"), mmap_mode=mmap_mode)
+        if storage == "float32":
+            vector_db._matrix = vectors
+        elif _saved_codes_match(path, storage, len(vectors)):
+            vector_db._matrix = np.load(os.path.join(path, "codes.npy"), mmap_mode=mmap_mode)
+            if storage == "int8":
+                vector_db._scales = np.load(
+                    os.path.join(path, "scales.npy"), mmap_mode=mmap_mode
+                )
+        elif storage == "int8":
+            vector_db._matrix, vector_db._scales = quantize_int8(vectors)
+        else:
+            vector_db._matrix = vectors.astype(STORAGE_DTYPES[storage])
+        if storage == "int8":
+            # Always memory-mapped: re-scoring reads only a few rows per query.
+            vector_db._full = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+            vector_db._full_rows = np.arange(len(vectors), dtype=np.int64)
+        vector_db._keys = records["keys"]
+        vector_db._texts = [
+            key if text is None else text
+            for key, text in zip(vector_db._keys, records.get("texts") or vector_db._keys)
+        ]
+        vector_db._metadata = records.get("metadata") or [None] * len(vector_db._keys)
+        for row, metadata in enumerate(vector_db._metadata):
+            vector_db.metadata_index.add(row, metadata)
+        vector_db._rows = {
+            key: row for row, key in enumerate(vector_db._keys) if key is not None
+        }
+        vector_db._tombstones = [
+            row for row, key in enumerate(vector_db._keys) if key is None
+        ]
+        for alias, representative in (records.get("aliases") or {}).items():
+            if representative in vector_db._rows:
+                vector_db._add_alias(alias, representative)
+        if lexical_index is not None:
+            for row in vector_db._rows.values():
+                lexical_index.add(row, vector_db._texts[row])
+        vector_db.rebuild_index()
+        return vector_db
+
+    async def abuild_from_list(
+        self,
+        list_of_text: List[str],
+        metadatas: List[Dict] = None,
+        ids: List[str] = None,
+        deduplicator: MinHashDeduplicator = None,
+    ) -> "VectorDatabase":
+        """
+        :param metadatas: Optional metadata dict per text
+        :param ids: Optional stable key per text; defaults to the text itself
+        :param deduplicator: Optional `MinHashDeduplicator`. Only one
+            representative per cluster of exact / near-duplicate texts is
+            embedded and stored; the other ids become aliases of it, so
+            `get_text`, `get_metadata` and `retrieve_from_key` still answer
+            for them while searches return each passage once.
+        """
+        metadatas = metadatas or [None] * len(list_of_text)
+        ids = ids or list_of_text
+        if deduplicator is None:
+            representatives = range(len(list_of_text))
+        else:
+            representatives = deduplicator.representatives(list_of_text)
+        unique = sorted(set(representatives))
+        embeddings = await self.embedding_model.async_get_embeddings(
+            [list_of_text[i] for i in unique]
+        )
+        for i, embedding in zip(unique, embeddings):
+            self.insert(ids[i], np.array(embedding), list_of_text[i], metadatas[i])
+        for key, representative in zip(ids, representatives):
+            if key != ids[representative]:
+                self._add_alias(key, ids[representative])
         return self
 
+    async def abuild_from_iterable(
+        self, texts: Iterable[str], batch_size: int = 256, max_pending: int = 4
+    ) -> "VectorDatabase":
+        """
+        Builds the database from a (possibly lazy) stream of texts.
+
+        Batches of `batch_size` texts are pulled from the iterable in a worker
+        thread, so loading and splitting overlap with embedding, and at most
+        `max_pending` batches are in flight at once, keeping memory bounded.
+        Batches are inserted in order as their embeddings arrive.
+
+        :param texts: Any iterable, e.g.
+            `splitter.iter_split(loader.iter_documents())`
+        """
+        iterator = iter(texts)
+        pending = deque()
+        while True:
+            batch = await asyncio.to_thread(list, itertools.islice(iterator, batch_size))
+            if batch:
+                pending.append(
+                    (batch, asyncio.ensure_future(self.embedding_model.async_get_embeddings(batch)))
+                )
+            if pending and (not batch or len(pending) >= max_pending):
+                done_batch, embeddings = pending.popleft()
+                for text, embedding in zip(done_batch, await embeddings):
+                    self.insert(text, embedding)
+            if not batch and not pending:
+                return self
+
 
 if __name__ == "__main__":
     list_of_text = [
@@ -70,6 +869,11 @@ if __name__ == "__main__":
     searched_vector = vector_db.search_by_text("I think fruit is awesome!", k=k)
     print(f"Closest {k} vector(s):", searched_vector)
 
+    searched_vector = vector_db.search_by_text(
+        "I think fruit is awesome!", k=k, distance_measure="l2"
+    )
+    print(f"Closest {k} vector(s) by L2 distance:", searched_vector)
+
     retrieved_vector = vector_db.retrieve_from_key(
         "I like to eat broccoli and bananas."
     )
@@ -79,3 +883,8 @@ if __name__ == "__main__":
         "I think fruit is awesome!", k=k, return_as_text=True
     )
     print(f"Closest {k} text(s):", relevant_texts)
+
+    relevant_texts = vector_db.search_many_by_text(
+        ["I think fruit is awesome!", "Which animals are cute?"], k=k, return_as_text=True
+    )
+    print(f"Closest {k} text(s) per query:", relevant_texts)
@@ -32,8 +32,11 @@ embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
 loader = PyMuPDFLoader("./data/Airbnb-10k.pdf")
 documents = loader.load()
 
+# Load the encoder once; looking it up on every length check dominates chunking time.
+tiktoken_encoding = tiktoken.encoding_for_model("gpt-4o")
+
 def tiktoken_len(text):
-    tokens = tiktoken.encoding_for_model("gpt-4o").encode(text)
+    tokens = tiktoken_encoding.encode(text)
     return len(tokens)
 
 text_splitter = RecursiveCharacterTextSplitter(
@@ -116,10 +119,16 @@ async def start_chat():
 async def handle_message(message: cl.Message):
     settings = cl.user_session.get("settings")
 
-    response = retrieval_augmented_qa_chain.invoke({"query": message.content})
-
-    # Retrieve and sends content back to user
-    content = response["response"].content
-    pretty_content = content.strip()  
-
-    await cl.Message(content=pretty_content).send()
+    # Run the chain asynchronously so other sessions keep being served, and
+    # stream the answer tokens into the message as the LLM produces them.
+    msg = cl.Message(content="")
+    async for chunk in retrieval_augmented_qa_chain.astream({"query": message.content}):
+        if "response" not in chunk:
+            continue
+        token = chunk["response"].content
+        if not msg.content:
+            token = token.lstrip()
+        if token:
+            await msg.stream_token(token)
+
+    await msg.send()
@@ -1,21 +1,17 @@
 import os
 import chainlit as cl
-import tiktoken
 import openai
 import fitz  
 import pandas as pd
+import threading
+from functools import lru_cache
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.http import models as qdrant_models
-from langchain.document_loaders import PyMuPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import OpenAIEmbeddings 
-from langchain_community.vectorstores import Qdrant
 from langchain.prompts import ChatPromptTemplate
 from langchain.chat_models import ChatOpenAI 
 from operator import itemgetter
 from langchain.schema.output_parser import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough
+from build_index import ensure_snapshot, load_vector_store
 
 # Set environment variables
 load_dotenv()
@@ -26,34 +22,21 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # Initialize OpenAI
 openai.api_key = OPENAI_API_KEY
 
-# Load embedding model
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# The PDF is parsed, split and embedded offline by build_index.py (run while
+# the Docker image is built). Here we only load that snapshot, rebuilding it
+# if the source document or embedding model changed since it was written.
+# Sessions load it from worker threads (cl.make_async); the lock makes
+# concurrent first sessions wait for one load instead of each building it.
+retriever_lock = threading.Lock()
 
-loader = PyMuPDFLoader("./data/Airbnb-10k.pdf")
-documents = loader.load()
+@lru_cache(maxsize=None)
+def load_retriever():
+    ensure_snapshot()
+    return load_vector_store().as_retriever()
 
-def tiktoken_len(text):
-    tokens = tiktoken.encoding_for_model("gpt-4o").encode(text)
-    return len(tokens)
-
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=1000, 
-    chunk_overlap=50,
-    length_function = tiktoken_len
-)
-
-split_documents = text_splitter.split_documents(documents)
-
-# Creating a Qdrant vector store
-qdrant_vector_store = Qdrant.from_documents(
-    split_documents,
-    embeddings,
-    location=":memory:",
-    collection_name="Airbnb-10k",
-)
-
-# Create a retriever
-retriever = qdrant_vector_store.as_retriever()
+def get_retriever():
+    with retriever_lock:
+        return load_retriever()
 
 # -- AUGMENTED -- #
 """
@@ -79,19 +62,22 @@ rag_prompt = ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
 # Define the LLM
 llm = ChatOpenAI(model_name="gpt-4o")
 
-retrieval_augmented_qa_chain = (
-    # INVOKE CHAIN WITH: {"query" : "<>"}
-    # "query" : populated by getting the value of the "query" key
-    # "context"  : populated by getting the value of the "query" key and chaining it into the base_retriever
-    {"context": itemgetter("query") | retriever, "query": itemgetter("query")}
-    # "context"  : is assigned to a RunnablePassthrough object (will not be called or considered in the next step)
-    #              by getting the value of the "context" key from the previous step
-    | RunnablePassthrough.assign(context=itemgetter("context"))
-    # "response" : the "context" and "query" values are used to format our prompt object and then piped
-    #              into the LLM and stored in a key called "response"
-    # "context"  : populated by getting the value of the "context" key from the previous step
-    | {"response": rag_prompt | llm, "context": itemgetter("context")}
-)
+@lru_cache(maxsize=None)
+def get_retrieval_augmented_qa_chain():
+    retriever = get_retriever()
+    return (
+        # INVOKE CHAIN WITH: {"query" : "<>"}
+        # "query" : populated by getting the value of the "query" key
+        # "context"  : populated by getting the value of the "query" key and chaining it into the base_retriever
+        {"context": itemgetter("query") | retriever, "query": itemgetter("query")}
+        # "context"  : is assigned to a RunnablePassthrough object (will not be called or considered in the next step)
+        #              by getting the value of the "context" key from the previous step
+        | RunnablePassthrough.assign(context=itemgetter("context"))
+        # "response" : the "context" and "query" values are used to format our prompt object and then piped
+        #              into the LLM and stored in a key called "response"
+        # "context"  : populated by getting the value of the "context" key from the previous step
+        | {"response": rag_prompt | llm, "context": itemgetter("context")}
+    )
 
 # Sets initial chat settings 
 @cl.on_chat_start  
@@ -110,17 +96,26 @@ async def start_chat():
         
     }
     cl.user_session.set("settings", settings)
+    # Loads the index snapshot on first use, off the event loop.
+    cl.user_session.set("chain", await cl.make_async(get_retrieval_augmented_qa_chain)())
 
 # Initializes user session w/ settings and retrieves context based on query
 
 @cl.on_message 
 async def handle_message(message: cl.Message):
     settings = cl.user_session.get("settings")
-
-    response = retrieval_augmented_qa_chain.invoke({"query": message.content})
-
-    # Retrieve and sends content back to user
-    content = response["response"].content
-    pretty_content = content.strip()  
-
-    await cl.Message(content=pretty_content).send()
+    retrieval_augmented_qa_chain = cl.user_session.get("chain")
+
+    # Run the chain asynchronously so other sessions keep being served, and
+    # stream the answer tokens into the message as the LLM produces them.
+    msg = cl.Message(content="")
+    async for chunk in retrieval_augmented_qa_chain.astream({"query": message.content}):
+        if "response" not in chunk:
+            continue
+        token = chunk["response"].content
+        if not msg.content:
+            token = token.lstrip()
+        if token:
+            await msg.stream_token(token)
+
+    await msg.send()
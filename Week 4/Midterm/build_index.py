@@ -0,0 +1,179 @@
+"""
+Offline indexing for the Midterm app.
+
+Run at image build time (see Dockerfile) to parse, split and embed the source
+PDF once and write a versioned snapshot:
+
+    python build_index.py [--force]
+
+The app loads the snapshot at startup and only rebuilds it when the source
+document's hash or the embedding model no longer match the manifest.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+import numpy as np
+import tiktoken
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as qdrant_models
+from langchain.document_loaders import PyMuPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.embeddings import OpenAIEmbeddings
+from langchain_community.vectorstores import Qdrant
+
+load_dotenv()
+
+SOURCE_PATH = "./data/Airbnb-10k.pdf"
+SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "./index_snapshot")
+EMBEDDING_MODEL = "text-embedding-3-small"
+COLLECTION_NAME = "Airbnb-10k"
+SNAPSHOT_VERSION = 1
+
+# Load the encoder once, and only when a snapshot is actually built; a warm
+# start never needs it.
+@lru_cache(maxsize=None)
+def get_tiktoken_encoding():
+    return tiktoken.encoding_for_model("gpt-4o")
+
+def tiktoken_len(text):
+    tokens = get_tiktoken_encoding().encode(text)
+    return len(tokens)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def split_source(source_path=SOURCE_PATH):
+    documents = PyMuPDFLoader(source_path).load()
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=50,
+        length_function = tiktoken_len
+    )
+    return text_splitter.split_documents(documents)
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def snapshot_is_current(snapshot_dir=SNAPSHOT_DIR, source_path=SOURCE_PATH, embedding_model=EMBEDDING_MODEL):
+    manifest = read_manifest(snapshot_dir)
+    return (
+        manifest is not None
+        and manifest.get("version") == SNAPSHOT_VERSION
+        and manifest.get("embedding_model") == embedding_model
+        and manifest.get("source_sha256") == file_sha256(source_path)
+    )
+
+def build_snapshot(snapshot_dir=SNAPSHOT_DIR, source_path=SOURCE_PATH, embedding_model=EMBEDDING_MODEL):
+    """
+    Splits and embeds the source into a private temporary directory and then
+    renames it into place, so concurrent builds never share files and readers
+    never see a half-written snapshot.
+    """
+    split_documents = split_source(source_path)
+    embeddings = OpenAIEmbeddings(model=embedding_model)
+    vectors = np.asarray(
+        embeddings.embed_documents([document.page_content for document in split_documents]),
+        dtype=np.float32,
+    )
+    snapshot_dir = os.path.abspath(snapshot_dir)
+    parent = os.path.dirname(snapshot_dir)
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=".index_snapshot-", dir=parent)
+    np.save(os.path.join(build_dir, "vectors.npy"), vectors)
+    with open(os.path.join(build_dir, "records.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            [
+                {"page_content": document.page_content, "metadata": document.metadata}
+                for document in split_documents
+            ],
+            f,
+            ensure_ascii=False,
+        )
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "source_sha256": file_sha256(source_path),
+        "embedding_model": embedding_model,
+        "dimension": int(vectors.shape[1]),
+        "count": int(vectors.shape[0]),
+    }
+    with open(os.path.join(build_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    stale_dir = None
+    if os.path.exists(snapshot_dir):
+        stale_dir = tempfile.mkdtemp(prefix=".index_snapshot-stale-", dir=parent)
+        try:
+            os.replace(snapshot_dir, os.path.join(stale_dir, "snapshot"))
+        except FileNotFoundError:
+            pass
+    try:
+        os.rename(build_dir, snapshot_dir)
+    except OSError:
+        # Another process put its snapshot in place first; use that one.
+        shutil.rmtree(build_dir, ignore_errors=True)
+        if not snapshot_is_current(snapshot_dir, source_path, embedding_model):
+            raise
+        manifest = read_manifest(snapshot_dir)
+    if stale_dir is not None:
+        shutil.rmtree(stale_dir, ignore_errors=True)
+    return manifest
+
+def ensure_snapshot(snapshot_dir=SNAPSHOT_DIR, source_path=SOURCE_PATH, embedding_model=EMBEDDING_MODEL, force=False):
+    """Rebuilds the snapshot only if it is missing or stale."""
+    if force or not snapshot_is_current(snapshot_dir, source_path, embedding_model):
+        return build_snapshot(snapshot_dir, source_path, embedding_model)
+    return read_manifest(snapshot_dir)
+
+def load_vector_store(snapshot_dir=SNAPSHOT_DIR, embedding_model=EMBEDDING_MODEL, batch_size=256):
+    """
+    Uploads a snapshot into an in-memory Qdrant collection without calling
+    the embeddings API. Vectors are memory-mapped and copied in batches.
+    """
+    manifest = read_manifest(snapshot_dir)
+    vectors = np.load(os.path.join(snapshot_dir, "vectors.npy"), mmap_mode="r")
+    with open(os.path.join(snapshot_dir, "records.json"), encoding="utf-8") as f:
+        records = json.load(f)
+
+    client = QdrantClient(location=":memory:")
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=qdrant_models.VectorParams(
+            size=manifest["dimension"], distance=qdrant_models.Distance.COSINE
+        ),
+    )
+    for start in range(0, len(records), batch_size):
+        end = min(start + batch_size, len(records))
+        client.upsert(
+            collection_name=COLLECTION_NAME,
+            points=qdrant_models.Batch(
+                ids=list(range(start, end)),
+                vectors=np.asarray(vectors[start:end]).tolist(),
+                payloads=records[start:end],
+            ),
+        )
+    return Qdrant(
+        client=client,
+        collection_name=COLLECTION_NAME,
+        embeddings=OpenAIEmbeddings(model=embedding_model),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Midterm app's index snapshot.")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the snapshot is current")
+    args = parser.parse_args()
+    manifest = ensure_snapshot(force=args.force)
+    print(f"Index snapshot in {SNAPSHOT_DIR}: {manifest['count']} chunks, {manifest['embedding_model']}")